@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -10,6 +10,7 @@ from config import settings
 from database import get_db
 from models import User
 from schemas import TokenData
+from utils_cache import TTLCache
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -17,6 +18,11 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT Bearer scheme
 security = HTTPBearer()
 
+# Authenticated users by bearer token, so dashboards firing a burst of requests
+# skip the JWT verification and user lookup after the first one. Short TTL:
+# role changes and deactivations take effect within AUTH_USER_CACHE_TTL.
+_user_cache = TTLCache(ttl=settings.AUTH_USER_CACHE_TTL, maxsize=4096)
+
 # ============================================
 # PASSWORD UTILITIES
 # ============================================
@@ -102,6 +108,10 @@ async def get_current_user(
     Use this in protected routes like: current_user: User = Depends(get_current_user)
     """
     token = credentials.credentials
+    user = _user_cache.get(token)
+    if user is not None:
+        return user
+    
     token_data = decode_access_token(token)
     
     user = await get_user_by_email(db, token_data.email)
@@ -112,4 +122,15 @@ async def get_current_user(
             detail="User not found",
         )
     
-    return user
\ No newline at end of file
+    # Never cache past the token's own expiry
+    expires_at = jwt.get_unverified_claims(token)["exp"]
+    ttl = min(settings.AUTH_USER_CACHE_TTL, expires_at - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        _user_cache.set(token, user, ttl=ttl)
+    
+    return user
+
+
+def forget_token(token: str) -> None:
+    """Drop a token's cached user (on logout)"""
+    _user_cache.pop(token)
\ No newline at end of file
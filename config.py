@@ -1,6 +1,6 @@
 
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 import os
 
@@ -11,19 +11,27 @@ class Settings(BaseSettings):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
     
     # Database Pool Settings (OPTIMIZED)
-    DB_POOL_SIZE: int = 20  # Number of connections to maintain
+    # Pools are per worker process, so keep
+    #   (DB_POOL_SIZE + DB_MAX_OVERFLOW) * WEB_WORKERS <= max_connections - reserved
+    DB_POOL_SIZE: int = 10  # Number of connections to maintain
     DB_MAX_OVERFLOW: int = 10  # Additional connections when pool is full
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a free connection
     DB_POOL_RECYCLE: int = 3600  # Recycle connections after 1 hour
     DB_POOL_PRE_PING: bool = True  # Test connections before using
+    DB_STATEMENT_CACHE_SIZE: int = 500  # asyncpg prepared statements kept per connection (0 behind pgbouncer)
+    DB_PGBOUNCER: bool = False  # Behind PgBouncer (transaction pooling): no app-side pool, no prepared statements
     
     # JWT
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
+    AUTH_USER_CACHE_TTL: int = 60  # Seconds to reuse a verified token's user (per worker)
     
     # Server
     BASE_URL: str = "https://qr-code-2-0-22ky.onrender.com"
+    ALLOWED_ORIGINS: List[str] = ["https://qr-code-2-0-22ky.onrender.com"]  # JSON list in env
     ENVIRONMENT: str = "production"  # development, staging, production
+    WEB_WORKERS: int = 4  # uvicorn worker processes in production
     
     # Logging
     LOG_LEVEL: str = "INFO"  # DEBUG, INFO, WARNING, ERROR
@@ -37,11 +45,21 @@ class Settings(BaseSettings):
     # RATE_LIMIT_PER_MINUTE: int = 60
     
     # Performance
-    ENABLE_QUERY_LOGGING: bool = False  # Set to False in production
+    ENABLE_QUERY_LOGGING: bool = False  # SQL echo; ignored when ENVIRONMENT is production
+    ANALYTICS_CACHE_TTL: int = 30  # Seconds to reuse identical analytics responses
+    ANALYTICS_CLOSED_RANGE_CACHE_TTL: int = 600  # Same, for date ranges ending before today (only hierarchy edits change them)
+    QR_GPS_WAIT_MS: int = 1500  # Longest the redirect page waits for a GPS fix before logging the scan
+    QR_CODE_CACHE_TTL: int = 60  # Seconds to reuse a /r/{code} lookup (edits reach other workers within this)
+    HEALTH_CHECK_INTERVAL: int = 5  # Seconds between background DB health checks
     
     # Background Tasks
     ENABLE_BACKGROUND_TASKS: bool = True
     LOCATION_LOOKUP_ASYNC: bool = True  # Lookup location in background
+    GEOIP_DB_PATH: Optional[str] = None  # GeoLite2-City.mmdb for local IP lookups (needs maxminddb); unset = ip-api.com
+    ROLLUP_REFRESH_INTERVAL: int = 900  # Seconds between daily-rollup staleness checks
+    SCAN_FLUSH_INTERVAL: float = 0.2  # Seconds between batched scan inserts
+    SCAN_BATCH_SIZE: int = 500  # Flush early once this many scans are buffered
+    SCAN_QUEUE_MAXSIZE: int = 10_000  # Beyond this, scans are inserted directly
     
     class Config:
         env_file = ".env"
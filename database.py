@@ -1,6 +1,7 @@
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import NullPool
 from typing import AsyncGenerator
 import logging
 from dotenv import load_dotenv
@@ -13,19 +14,40 @@ logger = logging.getLogger(__name__)
 
 # PostgreSQL connection string from config
 DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+
+if settings.DB_PGBOUNCER:
+    # PgBouncer does the pooling, and in transaction mode a prepared statement
+    # may not exist on the next transaction's server connection
+    pool_args = {"poolclass": NullPool}
+    statement_cache_args = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+else:
+    pool_args = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,  # Test connections before use
+        "pool_size": settings.DB_POOL_SIZE,  # Number of connections in pool
+        "max_overflow": settings.DB_MAX_OVERFLOW,  # Additional connections when needed
+        "pool_recycle": settings.DB_POOL_RECYCLE,  # Recycle stale connections
+        "pool_timeout": settings.DB_POOL_TIMEOUT,  # Wait for available connection
+    }
+    # Reuse server-side prepared statements (and their plans) for repeated queries
+    statement_cache_args = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+
+# Statement/pool logging formats every query's SQL and params - never in production
+query_logging = settings.ENABLE_QUERY_LOGGING and settings.ENVIRONMENT != "production"
+if not query_logging:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    logging.getLogger("sqlalchemy.pool").setLevel(logging.WARNING)
+
 # OPTIMIZED: Create async engine with proper pool configuration
 engine = create_async_engine(
     DATABASE_URL,
-    echo=settings.ENABLE_QUERY_LOGGING,  # Only log queries in development
+    echo=query_logging,  # Only log queries in development
     future=True,
-    pool_pre_ping=settings.DB_POOL_PRE_PING,  # Test connections before use
-    pool_size=settings.DB_POOL_SIZE,  # Number of connections in pool
-    max_overflow=settings.DB_MAX_OVERFLOW,  # Additional connections when needed
-    pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle stale connections
-    pool_timeout=30,  # Wait 30s for available connection
+    **pool_args,
     connect_args={
+        **statement_cache_args,
         "server_settings": {
             "application_name": "social_media",  # Identify connections in PostgreSQL
+            "jit": "off",  # Short analytics queries don't amortize JIT compilation
         }
     }
 )
@@ -59,6 +81,36 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+# Independent read queries for asyncio.gather
+async def fetch_all(statement) -> list:
+    """
+    Run a read-only statement on its own pooled connection and return all rows.
+    An AsyncSession can't run statements concurrently, so queries that are
+    gathered in parallel go through here instead of the request session.
+    """
+    async with engine.connect() as conn:
+        result = await conn.execute(statement)
+        return result.all()
+
+
+# Pool usage for /metrics
+def get_pool_stats() -> dict:
+    """
+    Snapshot of this worker's connection pool. checked_out creeping up to
+    size + max_overflow means requests are about to queue for pool_timeout.
+    """
+    pool = engine.pool
+    if isinstance(pool, NullPool):
+        return {"pooled": False}  # DB_PGBOUNCER: connections are pooled by PgBouncer
+
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+    }
+
+
 # OPTIMIZED: Connection health check
 async def check_db_connection():
     """
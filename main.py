@@ -1,10 +1,17 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+import asyncio
+import hashlib
 import logging
+import queue
 import time
+from logging.handlers import QueueHandler, QueueListener
 
 # Import routes with aliases to avoid conflicts
 from routes.auth import router as auth_router
@@ -14,33 +21,82 @@ from routes.social import router as social_router
 from routes.hierarchy import router as hierarchy_router
 from routes.analytics import router as analytics_router
 
-from database import close_db_connections, check_db_connection
+from database import close_db_connections, check_db_connection, get_pool_stats
+from rollups import rollup_refresh_loop
+from scan_writer import scan_flush_loop
+from utils_cache import analytics_cache
 from config import settings
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging - records are only enqueued on the event loop; the
+# listener thread does the blocking stream writes. The queue handler is
+# attached in lifespan together with the listener: `python main.py` imports
+# this module twice, and a handler attached at import would fill a queue
+# nobody drains.
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 )
+log_listener = QueueListener(log_queue, log_stream_handler)
+log_queue_handler = QueueHandler(log_queue)
+
+root_logger = logging.getLogger()
+root_logger.setLevel(getattr(logging, settings.LOG_LEVEL))
+
 logger = logging.getLogger(__name__)
 
+# Pre-bound to skip the module attribute lookup on every request
+perf_counter_ns = time.perf_counter_ns
+
+# Last DB health check result, kept fresh by health_check_loop so /health
+# probes don't each cost a round-trip (None until the loop has started)
+db_healthy: Optional[bool] = None
+
+
+async def health_check_loop():
+    """Background task: re-check the database every HEALTH_CHECK_INTERVAL seconds"""
+    global db_healthy
+    while True:
+        await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+        db_healthy = await check_db_connection()
+
 
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
+    root_logger.addHandler(log_queue_handler)
+    log_listener.start()
     logger.info(f"Starting GK QR Manager API - Environment: {settings.ENVIRONMENT}")
     
-    if await check_db_connection():
+    global db_healthy
+    db_healthy = await check_db_connection()
+    if db_healthy:
         logger.info("✅ Database connection successful")
     else:
         logger.error("❌ Database connection failed")
     
+    health_task = asyncio.create_task(health_check_loop())
+    rollup_task = None
+    scan_task = None
+    if settings.ENABLE_BACKGROUND_TASKS:
+        rollup_task = asyncio.create_task(rollup_refresh_loop())
+        scan_task = asyncio.create_task(scan_flush_loop())
+    
     yield
     
     logger.info("Shutting down GK QR Manager API")
+    health_task.cancel()
+    if rollup_task:
+        rollup_task.cancel()
+    if scan_task:
+        # Let it write the scans still buffered before the pool closes
+        scan_task.cancel()
+        await asyncio.gather(scan_task, return_exceptions=True)
     await close_db_connections()
     logger.info("✅ All connections closed gracefully")
+    log_listener.stop()
+    root_logger.removeHandler(log_queue_handler)
 
 
 # Create FastAPI app
@@ -59,14 +115,20 @@ app.mount("/static", StaticFiles(directory="templates"), name="static")
 # Request timing middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    """Add response time header to all requests"""
-    start_time = time.time()
+    """Add response time headers to all requests"""
+    start = perf_counter_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(round(process_time * 1000, 2))
+    dur_us = (perf_counter_ns() - start) // 1000
+    
+    # Format once, from integers (ms with two decimals, truncated);
+    # X-Process-Time kept for existing dashboards
+    ms, us = divmod(dur_us, 1000)
+    dur_ms = f"{ms}.{us // 10:02d}"
+    response.headers["Server-Timing"] = f"total;dur={dur_ms}"
+    response.headers["X-Process-Time"] = dur_ms
     
-    if process_time > 1.0:
-        logger.warning(f"Slow request: {request.method} {request.url.path} took {process_time:.2f}s")
+    if dur_us > 1_000_000 and logger.isEnabledFor(logging.WARNING):
+        logger.warning("Slow request: %s %s took %.2fs", request.method, request.url.path, dur_us / 1_000_000)
     
     return response
 
@@ -85,14 +147,17 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+# Compress HTML/JS/CSS/JSON responses (already-compressed images are skipped)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["X-Process-Time"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["authorization", "content-type"],
+    expose_headers=["X-Process-Time", "Server-Timing"],
 )
 
 # Include routers
@@ -105,46 +170,61 @@ app.include_router(analytics_router, tags=["Analytics"])
 
 
 # Serve static HTML files
-@app.get("/")
-async def root():
-    return FileResponse("templates/index.html")
+# ETags are computed once at startup; return visitors get an empty 304
+HTML_ETAGS = {
+    path.name: f'"{hashlib.md5(path.read_bytes()).hexdigest()}"'
+    for path in Path("templates").glob("*.html")
+}
 
 
-@app.get("/home")
-async def dashboard():
-    return FileResponse("templates/dashboard.html")
+def html_page(request: Request, filename: str) -> Response:
+    """Serve a template page, or 304 if the client already has this version"""
+    etag = HTML_ETAGS.get(filename)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"} if etag else None
+    
+    if etag and etag in request.headers.get("if-none-match", "").split(", "):
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(f"templates/{filename}", headers=headers)
 
 
-@app.get("/analytics-page")
-async def analytics_page():
-    return FileResponse("templates/analytics.html")
+# Page path -> template file. Registered as plain Starlette routes so they
+# skip FastAPI's dependency resolution and request validation.
+HTML_ROUTES = {
+    "/": "index.html",
+    "/home": "dashboard.html",
+    "/analytics-page": "analytics.html",
+    "/hierarchy-analytics": "hierarchy-dashboard.html",
+    "/hierarchy": "hierarchy.html",
+    "/social-analytics": "social-analytics.html",
+}
 
-@app.get("/hierarchy-analytics")
-async def hierarchy_analytics():
-    return FileResponse("templates/hierarchy-dashboard.html")
 
-@app.get("/hierarchy")
-async def hierarchy_page():
-    """Serve the hierarchy management page"""
-    return FileResponse("templates/hierarchy.html")
+def make_html_handler(filename: str):
+    """Build a bare request handler serving one template page"""
+    async def handler(request: Request) -> Response:
+        return html_page(request, filename)
+    
+    return handler
 
 
-@app.get("/social-analytics")
-async def social_analytics():
-    return FileResponse("templates/social-analytics.html")
+for page_path, page_file in HTML_ROUTES.items():
+    app.add_route(page_path, make_html_handler(page_file), methods=["GET"], include_in_schema=False)
 
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    db_healthy = await check_db_connection()
+    healthy = db_healthy
+    if healthy is None:
+        healthy = await check_db_connection()
     
     return {
-        "status": "healthy" if db_healthy else "degraded",
+        "status": "healthy" if healthy else "degraded",
         "version": "3.0.0",
         "environment": settings.ENVIRONMENT,
-        "database": "connected" if db_healthy else "disconnected"
+        "database": "connected" if healthy else "disconnected"
     }
 
 
@@ -156,6 +236,8 @@ async def metrics():
         "app": "gk_qr_manager",
         "version": "3.0.0",
         "environment": settings.ENVIRONMENT,
+        "analytics_cache": analytics_cache.stats(),
+        "db_pool": get_pool_stats(),
     }
 
 
@@ -167,8 +249,10 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=settings.ENVIRONMENT == "development",
-        workers=4 if settings.ENVIRONMENT == "production" else 1,
+        workers=settings.WEB_WORKERS if settings.ENVIRONMENT == "production" else 1,
         log_level=settings.LOG_LEVEL.lower(),
-        access_log=True,
-        use_colors=True,
+        loop="uvloop",  # uvloop + httptools ship with uvicorn[standard]
+        http="httptools",
+        access_log=settings.ENVIRONMENT != "production",  # Sync stderr write per request
+        use_colors=False,
     )
\ No newline at end of file
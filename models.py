@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -101,6 +101,13 @@ class QRCode(Base):
     __table_args__ = (
         Index('idx_branch_active', 'branch_id', 'is_active'),
         Index('idx_branch_created_at', 'branch_id', 'created_at'),
+        # Scan hot path, index-only: /r/{code} resolves the redirect by code,
+        # /api/scan-log looks up the scan's branch by QR id
+        Index(
+            'idx_qr_code_redirect', 'code', unique=True,
+            postgresql_include=['id', 'target_url', 'is_active']
+        ),
+        Index('idx_qr_id_branch', 'id', postgresql_include=['branch_id']),
     )
 
     def __repr__(self):
@@ -112,6 +119,7 @@ class QRScan(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     qr_code_id = Column(Integer, ForeignKey("qr_codes.id"), nullable=False, index=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False, index=True)  # Denormalized from qr_codes
     scanned_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Device info
@@ -142,12 +150,28 @@ class QRScan(Base):
         Index('idx_qr_location', 'qr_code_id', 'country', 'city'),
         Index('idx_scanned_at_qr', 'scanned_at', 'qr_code_id'),
         Index('idx_new_user', 'is_new_user', 'scanned_at'),
+        Index('idx_qrscan_branch_date_new', 'branch_id', 'scanned_at', 'is_new_user'),
     )
 
     def __repr__(self):
         return f"<QRScan(id={self.id}, qr_code_id={self.qr_code_id})>"
 
 
+class QRScanDaily(Base):
+    # Read-only: backed by the mv_qr_daily materialized view (see rollups.py),
+    # which holds per-branch scan counts for completed UTC days
+    __tablename__ = "mv_qr_daily"
+
+    branch_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    scans = Column(BigInteger, nullable=False)
+    new_scans = Column(BigInteger, nullable=False)
+    returning_scans = Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<QRScanDaily(branch_id={self.branch_id}, day={self.day}, scans={self.scans})>"
+
+
 class SocialClick(Base):
     __tablename__ = "social_clicks"
 
@@ -180,10 +204,36 @@ class SocialClick(Base):
         Index('idx_platform_clicked', 'platform', 'clicked_at'),
         Index('idx_clicked_at', 'clicked_at'),
         Index('idx_new_user_social', 'is_new_user', 'clicked_at'),
+        Index(
+            'idx_social_branch_clicked_new', 'branch_id', 'clicked_at', 'is_new_user',
+            postgresql_include=['platform']
+        ),
+        # Unscoped /analytics/social: date range + platform/new-user aggregates, index-only
+        Index(
+            'idx_social_clicked_platform_new', 'clicked_at',
+            postgresql_include=['platform', 'is_new_user']
+        ),
     )
 
     def __repr__(self):
         return f"<SocialClick(id={self.id}, platform='{self.platform}')>"
+
+
+class SocialClickDaily(Base):
+    # Read-only: backed by the mv_social_daily materialized view (see rollups.py),
+    # which holds per-branch, per-platform click counts for completed UTC days.
+    # branch_id is NULL for clicks not tied to a branch.
+    __tablename__ = "mv_social_daily"
+
+    branch_id = Column(Integer, primary_key=True, nullable=True)
+    day = Column(Date, primary_key=True)
+    platform = Column(String(50), primary_key=True)
+    clicks = Column(BigInteger, nullable=False)
+    new_clicks = Column(BigInteger, nullable=False)
+    returning_clicks = Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<SocialClickDaily(branch_id={self.branch_id}, day={self.day}, platform='{self.platform}', clicks={self.clicks})>"
     
 class SessionFirstSeen(Base):
     """
@@ -0,0 +1,286 @@
+"""
+Daily rollups for analytics.
+
+mv_qr_daily and mv_social_daily pre-aggregate qr_scans / social_clicks per
+branch per UTC day, so analytics over long date ranges sum one row per branch
+per day instead of counting every event. The views only hold completed days:
+everything from a view's watermark (its newest rolled-up day) onwards is
+still counted from the raw table. That newest day is recounted from the raw
+table on purpose: scans are batched and recorded after the response, so a few
+of yesterday's rows can land just after the midnight refresh - the view only
+picks them up at the next day's refresh. event_count_parts() builds that
+rollup + raw split for any count query.
+
+Each view is refreshed once per UTC day; the date of its last successful
+refresh is kept in rollup_refreshes, since an empty or sparse view's newest
+day says nothing about when it was refreshed.
+
+The views and refresh log are part of the externally managed schema:
+
+    CREATE MATERIALIZED VIEW mv_qr_daily AS
+    SELECT branch_id,
+           (scanned_at AT TIME ZONE 'UTC')::date AS day,
+           count(*) AS scans,
+           count(*) FILTER (WHERE is_new_user) AS new_scans,
+           count(*) FILTER (WHERE NOT is_new_user) AS returning_scans
+    FROM qr_scans
+    WHERE scanned_at < date_trunc('day', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+    GROUP BY 1, 2;
+    CREATE UNIQUE INDEX ON mv_qr_daily (branch_id, day);
+    CREATE INDEX ON mv_qr_daily (day);
+
+    CREATE MATERIALIZED VIEW mv_social_daily AS
+    SELECT branch_id,
+           (clicked_at AT TIME ZONE 'UTC')::date AS day,
+           platform,
+           count(*) AS clicks,
+           count(*) FILTER (WHERE is_new_user) AS new_clicks,
+           count(*) FILTER (WHERE NOT is_new_user) AS returning_clicks
+    FROM social_clicks
+    WHERE clicked_at < date_trunc('day', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+    GROUP BY 1, 2, 3;
+    CREATE UNIQUE INDEX ON mv_social_daily (branch_id, day, platform);
+    CREATE INDEX ON mv_social_daily (day);
+
+    CREATE TABLE rollup_refreshes (
+        view_name text PRIMARY KEY,
+        refreshed_on date NOT NULL
+    );
+"""
+
+from datetime import datetime, time, timezone
+from typing import Optional
+import asyncio
+import logging
+
+from sqlalchemy import Select, select, func, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import engine
+from models import QRScan, QRScanDaily, SocialClick, SocialClickDaily
+from utils_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Daily rollup views, refreshed in this order
+ROLLUP_MODELS = (QRScanDaily, SocialClickDaily)
+
+# Arbitrary key for pg_try_advisory_xact_lock so only one worker refreshes at a time
+ROLLUP_LOCK_KEY = 7_301_001
+
+# UTC day this worker last found every view refreshed, to skip the lock and
+# the rollup_refreshes lookup for the rest of the day
+_refreshed_on = None
+
+# Watermark lookups are shared by every analytics request; a stale (lower)
+# watermark is still correct, it just counts more days from the raw table
+_watermark_cache = TTLCache(ttl=60, maxsize=len(ROLLUP_MODELS))
+
+
+def _utc_midnight(day) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+async def get_rollup_watermark(model=QRScanDaily) -> Optional[datetime]:
+    """
+    Return the UTC midnight from which events for `model` are counted from
+    the raw table - the start of the view's newest day - or None if the view is empty or missing (callers then use the
+    raw table only).
+    """
+    view = model.__tablename__
+    watermark = _watermark_cache.get(view)
+    if watermark is not None:
+        return watermark or None  # False caches "no rollup"
+
+    try:
+        # Own connection, so a missing view can't abort the request's transaction
+        async with engine.connect() as conn:
+            last_day = await conn.scalar(select(func.max(model.day)))
+    except Exception as e:
+        logger.warning(f"Daily rollup {view} unavailable, using raw table: {e}")
+        _watermark_cache.set(view, False)
+        return None
+
+    if last_day is None:
+        _watermark_cache.set(view, False)
+        return None
+
+    # The newest day may still be getting late rows, so it stays on the raw side
+    watermark = _utc_midnight(last_day)
+    _watermark_cache.set(view, watermark)
+    return watermark
+
+
+async def refresh_rollups() -> bool:
+    """
+    Refresh every rollup view that hasn't been refreshed yet this UTC day.
+    Returns True if this worker refreshed at least one view.
+    """
+    global _refreshed_on
+    today = datetime.now(timezone.utc).date()
+    if _refreshed_on == today:
+        return False
+
+    async with engine.begin() as conn:
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY}
+        )
+        if not locked:
+            return False
+
+        # Read under the lock, so a worker that waited sees the last refresh
+        result = await conn.execute(text("SELECT view_name, refreshed_on FROM rollup_refreshes"))
+        last_refreshed = dict(result.all())
+        stale_views = [
+            model.__tablename__ for model in ROLLUP_MODELS
+            if last_refreshed.get(model.__tablename__) != today
+        ]
+
+        refreshed = []
+        for view in stale_views:
+            # Savepoint per view, so one missing view doesn't block the others
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+                    await conn.execute(
+                        text(
+                            "INSERT INTO rollup_refreshes (view_name, refreshed_on) "
+                            "VALUES (:view, :today) "
+                            "ON CONFLICT (view_name) DO UPDATE SET refreshed_on = EXCLUDED.refreshed_on"
+                        ),
+                        {"view": view, "today": today},
+                    )
+            except Exception as e:
+                logger.error(f"Daily rollup refresh of {view} failed: {e}")
+                continue
+            refreshed.append(view)
+
+    if len(refreshed) == len(stale_views):
+        _refreshed_on = today
+    if refreshed:
+        _watermark_cache.clear()
+        logger.info(f"✅ Refreshed daily rollups: {', '.join(refreshed)}")
+    return bool(refreshed)
+
+
+async def rollup_refresh_loop():
+    """Background task: keep the daily rollups caught up with completed days"""
+    while True:
+        try:
+            await refresh_rollups()
+        except Exception as e:
+            logger.error(f"Daily rollup refresh failed: {e}")
+
+        await asyncio.sleep(settings.ROLLUP_REFRESH_INTERVAL)
+
+
+# (total, new, returning) aggregate columns for each event table, built once at
+# import instead of per request; every hot count query selects these
+_EVENT_COUNTS = {
+    model: (
+        func.count().label("total"),  # count(*) - no id column, so index-only
+        # FILTER lets one pass over the rows compute all three counts
+        func.count().filter(model.is_new_user == True).label("new"),
+        func.count().filter(model.is_new_user == False).label("returning"),
+    )
+    for model in (QRScan, SocialClick)
+}
+
+
+# Each event table's timestamp column, daily rollup view, and the rollup's
+# (total, new, returning) columns lined up with _EVENT_COUNTS
+_ROLLUP_COUNTS = {
+    QRScan: (QRScan.scanned_at, QRScanDaily, (
+        QRScanDaily.scans.label("total"),
+        QRScanDaily.new_scans.label("new"),
+        QRScanDaily.returning_scans.label("returning"),
+    )),
+    SocialClick: (SocialClick.clicked_at, SocialClickDaily, (
+        SocialClickDaily.clicks.label("total"),
+        SocialClickDaily.new_clicks.label("new"),
+        SocialClickDaily.returning_clicks.label("returning"),
+    )),
+}
+
+
+async def event_count_parts(
+    raw_model,
+    key: str,
+    branch_ids: Optional[Select] = None,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None
+) -> list:
+    """
+    (key, total, new, returning) selects covering [start_dt, end_dt) for one
+    event table, limited to branch_ids if given: days before the rollup
+    watermark come from the daily view, the remaining (recent) days are
+    counted from the raw table. A key can appear in several rows, so callers
+    SUM them per key.
+    """
+    raw_timestamp, daily_model, daily_counts = _ROLLUP_COUNTS[raw_model]
+    parts = []
+    raw_start = start_dt
+
+    watermark = await get_rollup_watermark(daily_model)
+    if watermark is not None and (start_dt is None or start_dt < watermark):
+        rollup_end = watermark if end_dt is None else min(end_dt, watermark)
+        rollup_query = select(getattr(daily_model, key), *daily_counts).where(
+            daily_model.day < rollup_end.date()
+        )
+        if branch_ids is not None:
+            rollup_query = rollup_query.where(daily_model.branch_id.in_(branch_ids))
+        if start_dt is not None:
+            rollup_query = rollup_query.where(daily_model.day >= start_dt.date())
+
+        parts.append(rollup_query)
+        raw_start = watermark
+
+    if not parts or end_dt is None or raw_start is None or raw_start < end_dt:
+        raw_key = getattr(raw_model, key)
+        raw_query = select(raw_key, *_EVENT_COUNTS[raw_model]).group_by(raw_key)
+        if branch_ids is not None:
+            raw_query = raw_query.where(raw_model.branch_id.in_(branch_ids))
+        if raw_start is not None:
+            raw_query = raw_query.where(raw_timestamp >= raw_start)
+        if end_dt is not None:
+            raw_query = raw_query.where(raw_timestamp < end_dt)
+
+        parts.append(raw_query)
+
+    return parts
+
+
+def union_subquery(parts: list):
+    """Combine event_count_parts selects into one subquery to SUM over"""
+    return (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+
+
+async def get_platform_counts(
+    db: AsyncSession,
+    branch_ids: Optional[Select] = None,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None
+) -> list:
+    """
+    Social clicks per platform as (platform, total, new, returning) tuples,
+    plus a grand-total row with platform None (GROUP BY ROLLUP). Completed
+    days are summed from mv_social_daily, recent ones from social_clicks.
+    """
+    platform_counts = union_subquery(
+        await event_count_parts(SocialClick, "platform", branch_ids, start_dt, end_dt)
+    )
+    result = await db.execute(
+        select(
+            platform_counts.c.platform,
+            func.sum(platform_counts.c.total),
+            func.sum(platform_counts.c.new),
+            func.sum(platform_counts.c.returning),
+        ).group_by(func.rollup(platform_counts.c.platform))
+    )
+
+    # SUM over bigint comes back as Decimal
+    return [
+        (platform, *(int(count or 0) for count in counts))
+        for platform, *counts in result.all()
+    ]
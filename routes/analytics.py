@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import Row, Select, select, func, and_, or_, lambda_stmt, literal, union_all
 from typing import List, Optional
-from datetime import datetime, timedelta
-
-from database import get_db
+from pydantic_core import to_json
+from datetime import date, datetime
+from collections import defaultdict
+import asyncio
+import hashlib
+
+from database import get_db, fetch_all
+from utils import parse_date_window
 from auth import get_current_user
-from models import User, Region, Cluster, Branch, QRCode, QRScan, SocialClick
+from config import settings
+from utils_cache import analytics_cache, analytics_cache_key, analytics_cache_ttl
+from models import User, Region, Cluster, Branch, QRScan, SocialClick
+from rollups import event_count_parts, union_subquery, get_platform_counts
 from schemas import (
     RegionAnalytics, ClusterAnalytics, BranchAnalytics,
     NewVsReturning, SocialAnalytics
@@ -24,165 +33,320 @@ def require_super_admin(current_user: User):
         )
 
 
-async def calculate_new_vs_returning(
-    db: AsyncSession,
-    qr_base_query=None,
-    social_base_query=None
-) -> NewVsReturning:
-    """Calculate new vs returning users for QR scans and social clicks"""
-    
-    # Default queries if none provided
-    if qr_base_query is None:
-        qr_base_query = select(QRScan)
+def set_analytics_cache_headers(response: Response, etag: Optional[str] = None):
+    """Let the browser reuse analytics responses for the cache TTL"""
+    response.headers["Cache-Control"] = f"private, max-age={settings.ANALYTICS_CACHE_TTL}"
+    response.headers["Vary"] = "Authorization"
+    if etag:
+        response.headers["ETag"] = etag
+
+
+def analytics_etag(*parts: bytes) -> str:
+    """ETag for a pre-serialized analytics body (or its streamed parts)"""
+    digest = hashlib.md5()
+    for part in parts:
+        digest.update(part)
+    return f'"{digest.hexdigest()}"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    304 if the client already has this version, else None. Dashboards re-poll
+    with the same filters, so once max-age runs out they only revalidate.
+    """
+    if etag not in request.headers.get("if-none-match", "").split(", "):
+        return None
+
+    response = Response(status_code=304)
+    set_analytics_cache_headers(response, etag)
+    return response
+
+
+def analytics_json_response(body: bytes, request: Request) -> Response:
+    """
+    Wrap pre-serialized analytics JSON, skipping response_model re-validation.
+    Analytics handlers cache the to_json() bytes and serve them through here.
+    """
+    etag = analytics_etag(body)
+    response = not_modified(request, etag)
+    if response is None:
+        response = Response(content=body, media_type="application/json")
+        set_analytics_cache_headers(response, etag)
+    return response
+
+
+# Analytics models are built from already-typed query results and only ever
+# serialized, so they skip validation with model_construct()
+_EMPTY_NVR = NewVsReturning.model_construct(
+    new_users=0, returning_users=0, new_percentage=0.0, returning_percentage=0.0
+)
+
+
+def build_new_vs_returning(new_users: int, returning_users: int) -> NewVsReturning:
+    """Build the NewVsReturning breakdown (with percentages) from raw counts"""
+    total = new_users + returning_users
+    if total == 0:
+        # Shared by every row without activity - never mutated, only serialized
+        return _EMPTY_NVR
     
-    if social_base_query is None:
-        social_base_query = select(SocialClick)
+    return NewVsReturning.model_construct(
+        new_users=new_users,
+        returning_users=returning_users,
+        new_percentage=round((new_users / total * 100), 2),
+        returning_percentage=round((returning_users / total * 100), 2)
+    )
+
+
+async def get_hierarchy_counts(
+    scope_filters: list,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None
+):
+    """
+    Count QR scans and social clicks - total, new and returning - for every
+    branch matching scope_filters (over Branch/Cluster) with one GROUP BY
+    query per table.
     
-    # QR Scans - apply the base query and count
-    qr_new_query = qr_base_query.where(QRScan.is_new_user == True)
-    qr_returning_query = qr_base_query.where(QRScan.is_new_user == False)
+    Days before each table's rollup watermark are summed from mv_qr_daily /
+    mv_social_daily; only the remaining (recent) days are counted from the
+    raw tables. Both tables' counts come back from a single UNION ALL statement.
     
-    # Convert to count queries
-    qr_new_count_query = select(func.count()).select_from(qr_new_query.subquery())
-    qr_returning_count_query = select(func.count()).select_from(qr_returning_query.subquery())
+    Returns two nested dicts: {region_id: {cluster_id: {branch_id: (total, new, returning)}}}
+    """
+    # Scope is pushed into each part so the aggregation only touches branches in scope
+    scoped_branch_ids = select(Branch.id).join(Cluster).where(*scope_filters)
+    
+    qr_parts = await event_count_parts(QRScan, "branch_id", scoped_branch_ids, start_dt, end_dt)
+    social_parts = await event_count_parts(SocialClick, "branch_id", scoped_branch_ids, start_dt, end_dt)
+    
+    def counts_by_branch(kind: str, parts: list) -> Select:
+        branch_counts = union_subquery(parts)
+        return (
+            select(
+                literal(kind).label("kind"),
+                Cluster.region_id,
+                Branch.cluster_id,
+                branch_counts.c.branch_id,
+                func.sum(branch_counts.c.total),
+                func.sum(branch_counts.c.new),
+                func.sum(branch_counts.c.returning),
+            )
+            .join_from(branch_counts, Branch, Branch.id == branch_counts.c.branch_id)
+            .join(Cluster, Cluster.id == Branch.cluster_id)
+            .where(*scope_filters)
+            .group_by(Cluster.region_id, Branch.cluster_id, branch_counts.c.branch_id)
+        )
     
-    qr_new = (await db.execute(qr_new_count_query)).scalar() or 0
-    qr_returning = (await db.execute(qr_returning_count_query)).scalar() or 0
+    # One round-trip for both tables; rows are tagged with the table they count
+    rows = await fetch_all(union_all(
+        counts_by_branch("qr", qr_parts),
+        counts_by_branch("social", social_parts)
+    ))
     
-    # Social Clicks - apply the base query and count
-    social_new_query = social_base_query.where(SocialClick.is_new_user == True)
-    social_returning_query = social_base_query.where(SocialClick.is_new_user == False)
+    qr_counts = defaultdict(lambda: defaultdict(dict))
+    social_counts = defaultdict(lambda: defaultdict(dict))
+    for kind, region_id, cluster_id, branch_id, *counts in rows:
+        target = qr_counts if kind == "qr" else social_counts
+        # SUM over bigint comes back as Decimal
+        target[region_id][cluster_id][branch_id] = tuple(int(count or 0) for count in counts)
     
-    # Convert to count queries
-    social_new_count_query = select(func.count()).select_from(social_new_query.subquery())
-    social_returning_count_query = select(func.count()).select_from(social_returning_query.subquery())
+    return qr_counts, social_counts
+
+
+_NO_COUNTS = (0, 0, 0)
+
+
+def _sum_counts(counts) -> tuple:
+    """Total a (possibly nested) get_hierarchy_counts bucket into (total, new, returning)"""
+    if not isinstance(counts, dict):
+        return counts
     
-    social_new = (await db.execute(social_new_count_query)).scalar() or 0
-    social_returning = (await db.execute(social_returning_count_query)).scalar() or 0
+    total = new = returning = 0
+    for value in counts.values():
+        value_total, value_new, value_returning = _sum_counts(value)
+        total += value_total
+        new += value_new
+        returning += value_returning
     
-    # Combine
-    total_new = qr_new + social_new
-    total_returning = qr_returning + social_returning
-    total = total_new + total_returning
+    return total, new, returning
+
+
+def _combine_counts(qr_counts, social_counts) -> tuple:
+    """Reduce QR + social buckets to (total_qr_scans, total_social_clicks, NewVsReturning)"""
+    qr_total, qr_new, qr_returning = _sum_counts(qr_counts)
+    social_total, social_new, social_returning = _sum_counts(social_counts)
     
-    return NewVsReturning(
-        new_users=total_new,
-        returning_users=total_returning,
-        new_percentage=round((total_new / total * 100), 2) if total > 0 else 0.0,
-        returning_percentage=round((total_returning / total * 100), 2) if total > 0 else 0.0
+    return (
+        qr_total,
+        social_total,
+        build_new_vs_returning(qr_new + social_new, qr_returning + social_returning)
+    )
+
+
+def build_branch_analytics(
+    branch_id: int,
+    branch_name: str,
+    cluster_id: int,
+    qr_counts,
+    social_counts
+) -> BranchAnalytics:
+    """Build BranchAnalytics for a branch from its get_hierarchy_counts buckets"""
+    total_qr_scans, total_social_clicks, new_vs_returning = _combine_counts(
+        qr_counts, social_counts
+    )
+
+    return BranchAnalytics.model_construct(
+        branch_id=branch_id,
+        branch_name=branch_name,
+        cluster_id=cluster_id,
+        total_qr_scans=total_qr_scans,
+        total_social_clicks=total_social_clicks,
+        combined_total=total_qr_scans + total_social_clicks,
+        new_vs_returning=new_vs_returning
     )
 
+
 # ============================================
 # REGION ANALYTICS
 # ============================================
 @router.get("/regions", response_model=List[RegionAnalytics])
 async def get_region_analytics(
+    request: Request,
     region_id: Optional[int] = Query(None, description="Specific region ID"),
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
     include_details: bool = Query(False, description="Include cluster and branch breakdown"),
+    response_format: str = Query(
+        "json", alias="format", pattern="^(json|ndjson)$",
+        description="json array, or ndjson to stream one region per line"
+    ),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     require_super_admin(current_user)
 
-    # ---------------- DATE FILTERS ----------------
-    qr_date_filters = []
-    social_date_filters = []
+    cache_key = analytics_cache_key(
+        "regions",
+        region_id=region_id,
+        start_date=start_date,
+        end_date=end_date,
+        include_details=include_details
+    )
+    # Cached as one JSON document per region so both formats share the entry
+    region_parts = analytics_cache.get(cache_key)
+    if region_parts is None:
+        analytics = await get_region_analytics_internal(
+            db, region_id, *parse_date_window(start_date, end_date), include_details
+        )
+        region_parts = tuple(to_json(region) for region in analytics)
+        analytics_cache.set(cache_key, region_parts, ttl=analytics_cache_ttl(cache_key))
+
+    etag = analytics_etag(response_format.encode(), *region_parts)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    # Both formats stream the cached per-region documents as they are, instead of
+    # joining a second full copy of a (possibly large, include_details) payload
+    if response_format == "ndjson":
+        response = StreamingResponse(
+            (part + b"\n" for part in region_parts),
+            media_type="application/x-ndjson"
+        )
+    else:
+        response = StreamingResponse(
+            _json_array_chunks(region_parts), media_type="application/json"
+        )
+    set_analytics_cache_headers(response, etag)
+    return response
+
+
+def _json_array_chunks(parts: tuple):
+    """Yield pre-serialized JSON documents as the chunks of one JSON array"""
+    yield b"["
+    for index, part in enumerate(parts):
+        yield part if index == 0 else b"," + part
+    yield b"]"
 
-    try:
-        if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-            qr_date_filters.append(QRScan.scanned_at >= start_dt)
-            social_date_filters.append(SocialClick.clicked_at >= start_dt)
 
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            qr_date_filters.append(QRScan.scanned_at <= end_dt)
-            social_date_filters.append(SocialClick.clicked_at <= end_dt)
-    except ValueError:
-        pass
+async def get_region_analytics_internal(
+    db: AsyncSession,
+    region_id: Optional[int] = None,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
+    include_details: bool = False
+) -> List[RegionAnalytics]:
+    """Internal function to get region analytics"""
 
     # ---------------- FETCH REGIONS ----------------
-    region_query = select(Region).where(Region.is_active == True)
+    # Only the columns used below - plain Rows skip ORM instance construction
+    region_query = select(Region.id, Region.name).where(Region.is_active == True)
 
-    if region_id:
+    if region_id is not None:
         region_query = region_query.where(Region.id == region_id)
 
-    region_query = region_query.order_by(Region.name)
+    # Scope the count/topology queries with the region filter as a subquery rather
+    # than an IN list of fetched ids - same SQL shape whatever the region count
+    region_ids = region_query.with_only_columns(Region.id)
+
+    # ---------------- CLUSTER + BRANCH HIERARCHY ----------------
+    # Whole cluster -> branch topology in one query; clusters without
+    # active branches still come back (branch columns NULL)
+    hierarchy_query = (
+        select(
+            Cluster.id,
+            Cluster.name,
+            Cluster.region_id,
+            Branch.id.label("branch_id"),
+            Branch.name.label("branch_name")
+        )
+        .outerjoin(Branch, and_(Branch.cluster_id == Cluster.id, Branch.is_active == True))
+        .where(Cluster.region_id.in_(region_ids), Cluster.is_active == True)
+        .order_by(Cluster.name, Cluster.id, Branch.name)
+    )
 
-    regions_result = await db.execute(region_query)
-    regions = regions_result.scalars().all()
+    async def fetch_hierarchy() -> list:
+        return await fetch_all(hierarchy_query) if include_details else []
+
+    # Regions, counts and topology only share the region filter (as a subquery),
+    # so run them concurrently - regions on the session, the rest on their own connections
+    regions_result, (qr_counts, social_counts), hierarchy_rows = await asyncio.gather(
+        db.execute(region_query.order_by(Region.name)),
+        get_hierarchy_counts(
+            [Cluster.region_id.in_(region_ids), Branch.is_active == True], start_dt, end_dt
+        ),
+        fetch_hierarchy()
+    )
+    regions = regions_result.all()
 
-    analytics = []
+    if not regions:
+        return []
 
-    for region in regions:
-        # ---------------- BRANCH IDS ----------------
-        branch_ids_query = (
-            select(Branch.id)
-            .join(Cluster)
-            .where(Cluster.region_id == region.id, Branch.is_active == True)
-        )
-        branch_ids_result = await db.execute(branch_ids_query)
-        branch_ids = [row[0] for row in branch_ids_result.all()]
-
-        if not branch_ids:
-            # If no branches, return zero analytics
-            region_analytics = RegionAnalytics(
-                region_id=region.id,
-                region_name=region.name,
-                total_qr_scans=0,
-                total_social_clicks=0,
-                detailed_platform_breakdown=[],
-                combined_total=0,
-                new_vs_returning=NewVsReturning(
-                    new_users=0,
-                    returning_users=0,
-                    new_percentage=0.0,
-                    returning_percentage=0.0
-                ),
-                clusters=[]
-            )
-            analytics.append(region_analytics)
-            continue
-
-        # ---------------- QR SCANS ----------------
-        qr_query = (
-            select(func.count(QRScan.id))
-            .join(QRCode)
-            .where(QRCode.branch_id.in_(branch_ids))
-        )
-        if qr_date_filters:
-            qr_query = qr_query.where(and_(*qr_date_filters))
+    clusters_by_region = defaultdict(list)
+    branches_by_cluster = defaultdict(list)
 
-        total_qr_scans = (await db.execute(qr_query)).scalar() or 0
+    for row in hierarchy_rows:
+        if row.id not in branches_by_cluster:
+            clusters_by_region[row.region_id].append(row)
+            branches_by_cluster[row.id] = []
+        if row.branch_id is not None:
+            branches_by_cluster[row.id].append((row.branch_id, row.branch_name))
 
-        # ---------------- SOCIAL CLICKS ----------------
-        social_query = select(func.count(SocialClick.id)).where(
-            SocialClick.branch_id.in_(branch_ids)
-        )
-        if social_date_filters:
-            social_query = social_query.where(and_(*social_date_filters))
+    analytics = []
 
-        total_social_clicks = (await db.execute(social_query)).scalar() or 0
+    for region in regions:
+        region_qr = qr_counts.get(region.id, {})
+        region_social = social_counts.get(region.id, {})
 
-        # ---------------- NEW VS RETURNING ----------------
-        # IMPORTANT: Build queries with proper filtering
-        qr_base_query = select(QRScan).join(QRCode).where(QRCode.branch_id.in_(branch_ids))
-        social_base_query = select(SocialClick).where(SocialClick.branch_id.in_(branch_ids))
-        
-        # Add date filters if they exist
-        if qr_date_filters:
-            qr_base_query = qr_base_query.where(and_(*qr_date_filters))
-        
-        if social_date_filters:
-            social_base_query = social_base_query.where(and_(*social_date_filters))
+        # Sum each cluster's branches once; region totals and cluster rows reuse them
+        cluster_qr_totals = {cid: _sum_counts(counts) for cid, counts in region_qr.items()}
+        cluster_social_totals = {cid: _sum_counts(counts) for cid, counts in region_social.items()}
 
-        new_vs_returning = await calculate_new_vs_returning(
-            db, qr_base_query, social_base_query
+        total_qr_scans, total_social_clicks, new_vs_returning = _combine_counts(
+            cluster_qr_totals, cluster_social_totals
         )
 
-        region_analytics = RegionAnalytics(
+        region_analytics = RegionAnalytics.model_construct(
             region_id=region.id,
             region_name=region.name,
             total_qr_scans=total_qr_scans,
@@ -193,23 +357,36 @@ async def get_region_analytics(
         )
 
         # ---------------- CLUSTER + BRANCH BREAKDOWN ----------------
-        if include_details:
-            clusters_result = await db.execute(
-                select(Cluster)
-                .where(Cluster.region_id == region.id, Cluster.is_active == True)
-                .order_by(Cluster.name)
+        for cluster in clusters_by_region.get(region.id, ()):
+            cluster_qr = region_qr.get(cluster.id, {})
+            cluster_social = region_social.get(cluster.id, {})
+
+            cluster_qr_scans, cluster_social_clicks, cluster_new_vs_returning = _combine_counts(
+                cluster_qr_totals.get(cluster.id, _NO_COUNTS),
+                cluster_social_totals.get(cluster.id, _NO_COUNTS)
             )
-            clusters = clusters_result.scalars().all()
-
-            for cluster in clusters:
-                cluster_analytics = await get_cluster_analytics_internal(
-                    db=db,
-                    cluster=cluster,
-                    start_date=start_date,
-                    end_date=end_date,
-                    include_branches=True
-                )
-                region_analytics.clusters.append(cluster_analytics)
+
+            cluster_analytics = ClusterAnalytics.model_construct(
+                cluster_id=cluster.id,
+                cluster_name=cluster.name,
+                region_id=cluster.region_id,
+                total_qr_scans=cluster_qr_scans,
+                total_social_clicks=cluster_social_clicks,
+                combined_total=cluster_qr_scans + cluster_social_clicks,
+                new_vs_returning=cluster_new_vs_returning,
+                branches=[]
+            )
+
+            for branch_id, branch_name in branches_by_cluster[cluster.id]:
+                cluster_analytics.branches.append(build_branch_analytics(
+                    branch_id,
+                    branch_name,
+                    cluster.id,
+                    cluster_qr.get(branch_id, _NO_COUNTS),
+                    cluster_social.get(branch_id, _NO_COUNTS)
+                ))
+
+            region_analytics.clusters.append(cluster_analytics)
 
         analytics.append(region_analytics)
 
@@ -221,93 +398,25 @@ async def get_region_analytics(
 # ============================================
 async def get_cluster_analytics_internal(
     db: AsyncSession,
-    cluster: Cluster,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    cluster: Row,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
     include_branches: bool = False
 ) -> ClusterAnalytics:
-    """Internal function to get cluster analytics"""
-    
-    # Build date filters for both QR and Social
-    qr_date_filters = []
-    social_date_filters = []
-    
-    if start_date:
-        try:
-            start_dt = datetime.fromisoformat(start_date)
-            qr_date_filters.append(QRScan.scanned_at >= start_dt)
-            social_date_filters.append(SocialClick.clicked_at >= start_dt)
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            qr_date_filters.append(QRScan.scanned_at <= end_dt)
-            social_date_filters.append(SocialClick.clicked_at <= end_dt)
-        except ValueError:
-            pass
-    
-    # Get all branches in this cluster
-    branch_ids_query = select(Branch.id).where(
-        Branch.cluster_id == cluster.id,
-        Branch.is_active == True
-    )
-    branch_ids_result = await db.execute(branch_ids_query)
-    branch_ids = [row[0] for row in branch_ids_result.all()]
-    
-    if not branch_ids:
-        # Return empty analytics if no branches
-        return ClusterAnalytics(
-            cluster_id=cluster.id,
-            cluster_name=cluster.name,
-            region_id=cluster.region_id,
-            total_qr_scans=0,
-            total_social_clicks=0,
-            combined_total=0,
-            new_vs_returning=NewVsReturning(
-                new_users=0,
-                returning_users=0,
-                new_percentage=0.0,
-                returning_percentage=0.0
-            ),
-            branches=[]
-        )
-    
-    # QR Scans
-    qr_query = select(func.count(QRScan.id)).join(QRCode).where(
-        QRCode.branch_id.in_(branch_ids)
-    )
-    if qr_date_filters:
-        qr_query = qr_query.where(and_(*qr_date_filters))
-    
-    total_qr_scans = (await db.execute(qr_query)).scalar() or 0
-    
-    # Social Clicks
-    social_query = select(func.count(SocialClick.id)).where(
-        SocialClick.branch_id.in_(branch_ids)
+    """Internal function to get cluster analytics (cluster: id, name, region_id row)"""
+
+    # ---------------- QR + SOCIAL COUNTS (CLUSTER + BRANCHES) ----------------
+    qr_counts, social_counts = await get_hierarchy_counts(
+        [Branch.cluster_id == cluster.id, Branch.is_active == True], start_dt, end_dt
     )
-    if social_date_filters:
-        social_query = social_query.where(and_(*social_date_filters))
-    
-    total_social_clicks = (await db.execute(social_query)).scalar() or 0
-    
-    # New vs Returning - BUILD QUERY OBJECTS, NOT FILTER LISTS
-    qr_base_query = select(QRScan).join(QRCode).where(QRCode.branch_id.in_(branch_ids))
-    social_base_query = select(SocialClick).where(SocialClick.branch_id.in_(branch_ids))
-    
-    # Add date filters if they exist
-    if qr_date_filters:
-        qr_base_query = qr_base_query.where(and_(*qr_date_filters))
-    
-    if social_date_filters:
-        social_base_query = social_base_query.where(and_(*social_date_filters))
-    
-    new_vs_returning = await calculate_new_vs_returning(
-        db, qr_base_query, social_base_query
+    cluster_qr = qr_counts.get(cluster.region_id, {}).get(cluster.id, {})
+    cluster_social = social_counts.get(cluster.region_id, {}).get(cluster.id, {})
+
+    total_qr_scans, total_social_clicks, new_vs_returning = _combine_counts(
+        cluster_qr, cluster_social
     )
-    
-    cluster_analytics = ClusterAnalytics(
+
+    cluster_analytics = ClusterAnalytics.model_construct(
         cluster_id=cluster.id,
         cluster_name=cluster.name,
         region_id=cluster.region_id,
@@ -317,48 +426,67 @@ async def get_cluster_analytics_internal(
         new_vs_returning=new_vs_returning,
         branches=[]
     )
-    
-    # Include branch details if requested
+
+    # Include branch details if requested - counts are already in cluster_qr/cluster_social
     if include_branches:
-        branches_result = await db.execute(
-            select(Branch).where(
-                Branch.cluster_id == cluster.id,
+        # Fixed-shape lookups are lambda_stmt: built and cached once, only the id is re-bound
+        cluster_id = cluster.id
+        branches_result = await db.execute(lambda_stmt(
+            lambda: select(Branch.id, Branch.name, Branch.cluster_id).where(
+                Branch.cluster_id == cluster_id,
                 Branch.is_active == True
             ).order_by(Branch.name)
-        )
-        branches = branches_result.scalars().all()
-        
-        for branch in branches:
-            branch_analytics = await get_branch_analytics_internal(
-                db, branch, start_date, end_date
-            )
-            cluster_analytics.branches.append(branch_analytics)
-    
+        ))
+
+        for branch in branches_result.all():
+            cluster_analytics.branches.append(build_branch_analytics(
+                branch.id,
+                branch.name,
+                branch.cluster_id,
+                cluster_qr.get(branch.id, _NO_COUNTS),
+                cluster_social.get(branch.id, _NO_COUNTS)
+            ))
+
     return cluster_analytics
 
 @router.get("/clusters/{cluster_id}", response_model=ClusterAnalytics)
 async def get_cluster_analytics(
+    request: Request,
     cluster_id: int,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    include_branches: bool = Query(True, description="Include branch breakdown"),
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    include_branches: bool = Query(False, description="Include branch breakdown (opt-in, like include_details on /regions)"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get analytics for a specific cluster"""
     require_super_admin(current_user)
     
-    result = await db.execute(
-        select(Cluster).where(Cluster.id == cluster_id)
+    cache_key = analytics_cache_key(
+        "cluster",
+        cluster_id=cluster_id,
+        start_date=start_date,
+        end_date=end_date,
+        include_branches=include_branches
     )
-    cluster = result.scalar_one_or_none()
-    
-    if not cluster:
-        raise HTTPException(status_code=404, detail="Cluster not found")
+    body = analytics_cache.get(cache_key)
+    if body is None:
+        # Only the columns the analytics use - a Row, not an ORM instance
+        result = await db.execute(lambda_stmt(
+            lambda: select(Cluster.id, Cluster.name, Cluster.region_id).where(Cluster.id == cluster_id)
+        ))
+        cluster = result.first()
+        
+        if not cluster:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        
+        analytics = await get_cluster_analytics_internal(
+            db, cluster, *parse_date_window(start_date, end_date), include_branches
+        )
+        body = to_json(analytics)
+        analytics_cache.set(cache_key, body, ttl=analytics_cache_ttl(cache_key))
     
-    return await get_cluster_analytics_internal(
-        db, cluster, start_date, end_date, include_branches
-    )
+    return analytics_json_response(body, request)
 
 
 # ============================================
@@ -366,137 +494,112 @@ async def get_cluster_analytics(
 # ============================================
 async def get_branch_analytics_internal(
     db: AsyncSession,
-    branch: Branch,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    branch: Row,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None
 ) -> BranchAnalytics:
-    """Internal function to get branch analytics"""
-    
-    # Build date filters for both QR and Social
-    qr_date_filters = []
-    social_date_filters = []
-    
-    if start_date:
-        try:
-            start_dt = datetime.fromisoformat(start_date)
-            qr_date_filters.append(QRScan.scanned_at >= start_dt)
-            social_date_filters.append(SocialClick.clicked_at >= start_dt)
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            qr_date_filters.append(QRScan.scanned_at <= end_dt)
-            social_date_filters.append(SocialClick.clicked_at <= end_dt)
-        except ValueError:
-            pass
-    
-    # QR Scans
-    qr_query = select(func.count(QRScan.id)).join(QRCode).where(
-        QRCode.branch_id == branch.id
-    )
-    if qr_date_filters:
-        qr_query = qr_query.where(and_(*qr_date_filters))
-    
-    total_qr_scans = (await db.execute(qr_query)).scalar() or 0
-    
-    # Social Clicks
-    social_query = select(func.count(SocialClick.id)).where(
-        SocialClick.branch_id == branch.id
-    )
-    if social_date_filters:
-        social_query = social_query.where(and_(*social_date_filters))
-    
-    total_social_clicks = (await db.execute(social_query)).scalar() or 0
-    
-    # New vs Returning - BUILD QUERY OBJECTS, NOT FILTER LISTS
-    qr_base_query = select(QRScan).join(QRCode).where(QRCode.branch_id == branch.id)
-    social_base_query = select(SocialClick).where(SocialClick.branch_id == branch.id)
-    
-    # Add date filters if they exist
-    if qr_date_filters:
-        qr_base_query = qr_base_query.where(and_(*qr_date_filters))
-    
-    if social_date_filters:
-        social_base_query = social_base_query.where(and_(*social_date_filters))
-    
-    new_vs_returning = await calculate_new_vs_returning(
-        db, qr_base_query, social_base_query
+    """Internal function to get branch analytics (branch: id, name, cluster_id row)"""
+
+    # Not limited to active branches - an inactive branch keeps its history
+    qr_counts, social_counts = await get_hierarchy_counts(
+        [Branch.id == branch.id], start_dt, end_dt
     )
-    
-    return BranchAnalytics(
-        branch_id=branch.id,
-        branch_name=branch.name,
-        cluster_id=branch.cluster_id,
-        total_qr_scans=total_qr_scans,
-        total_social_clicks=total_social_clicks,
-        combined_total=total_qr_scans + total_social_clicks,
-        new_vs_returning=new_vs_returning
+
+    return build_branch_analytics(
+        branch.id, branch.name, branch.cluster_id, qr_counts, social_counts
     )
 
 @router.get("/branches/{branch_id}", response_model=BranchAnalytics)
 async def get_branch_analytics(
+    request: Request,
     branch_id: int,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get analytics for a specific branch"""
     require_super_admin(current_user)
     
-    result = await db.execute(
-        select(Branch).where(Branch.id == branch_id)
+    cache_key = analytics_cache_key(
+        "branch",
+        branch_id=branch_id,
+        start_date=start_date,
+        end_date=end_date
     )
-    branch = result.scalar_one_or_none()
-    
-    if not branch:
-        raise HTTPException(status_code=404, detail="Branch not found")
+    body = analytics_cache.get(cache_key)
+    if body is None:
+        # Only the columns the analytics use - a Row, not an ORM instance
+        result = await db.execute(lambda_stmt(
+            lambda: select(Branch.id, Branch.name, Branch.cluster_id).where(Branch.id == branch_id)
+        ))
+        branch = result.first()
+        
+        if not branch:
+            raise HTTPException(status_code=404, detail="Branch not found")
+        
+        analytics = await get_branch_analytics_internal(
+            db, branch, *parse_date_window(start_date, end_date)
+        )
+        body = to_json(analytics)
+        analytics_cache.set(cache_key, body, ttl=analytics_cache_ttl(cache_key))
     
-    return await get_branch_analytics_internal(db, branch, start_date, end_date)
+    return analytics_json_response(body, request)
 
 
 @router.get("/branches/{branch_id}/social-breakdown")
 async def get_branch_social_breakdown(
+    request: Request,
     branch_id: int,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get social media platform breakdown for a specific branch"""
     require_super_admin(current_user)
     
-    result = await db.execute(select(Branch).where(Branch.id == branch_id))
-    branch = result.scalar_one_or_none()
-    if not branch:
-        raise HTTPException(status_code=404, detail="Branch not found")
-    
-    query = select(
-        SocialClick.platform,
-        func.count(SocialClick.id).label('count')
-    ).where(SocialClick.branch_id == branch_id)
-    
-    if start_date:
-        try:
-            query = query.where(SocialClick.clicked_at >= datetime.fromisoformat(start_date))
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            query = query.where(SocialClick.clicked_at <= end_dt)
-        except ValueError:
-            pass
+    cache_key = analytics_cache_key(
+        "branch_social",
+        branch_id=branch_id,
+        start_date=start_date,
+        end_date=end_date
+    )
+    body = analytics_cache.get(cache_key)
+    if body is None:
+        breakdown = await get_branch_social_breakdown_internal(
+            db, branch_id, *parse_date_window(start_date, end_date)
+        )
+        body = to_json(breakdown)
+        analytics_cache.set(cache_key, body, ttl=analytics_cache_ttl(cache_key))
     
-    query = query.group_by(SocialClick.platform).order_by(func.count(SocialClick.id).desc())
+    return analytics_json_response(body, request)
+
+
+async def get_branch_social_breakdown_internal(
+    db: AsyncSession,
+    branch_id: int,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None
+) -> dict:
+    """Internal function to get a branch's platform breakdown (404 if unknown)"""
+    branch_name = await db.scalar(lambda_stmt(
+        lambda: select(Branch.name).where(Branch.id == branch_id)
+    ))
+    if branch_name is None:
+        raise HTTPException(status_code=404, detail="Branch not found")
     
-    result = await db.execute(query)
-    breakdown = [{"platform": row.platform, "count": row.count} for row in result.all()]
+    platform_counts = await get_platform_counts(
+        db, select(Branch.id).where(Branch.id == branch_id), start_dt, end_dt
+    )
+    breakdown = [
+        {"platform": platform, "count": count}
+        for platform, count, _, _ in platform_counts
+        if platform is not None
+    ]
+    breakdown.sort(key=lambda p: p["count"], reverse=True)
     
-    return {"branch_id": branch_id, "branch_name": branch.name, "platform_breakdown": breakdown}
+    return {"branch_id": branch_id, "branch_name": branch_name, "platform_breakdown": breakdown}
 
 
 # ============================================
@@ -504,11 +607,12 @@ async def get_branch_social_breakdown(
 # ============================================
 @router.get("/social", response_model=SocialAnalytics)
 async def get_social_analytics(
+    request: Request,
     region_id: Optional[int] = None,
     cluster_id: Optional[int] = None,
     branch_id: Optional[int] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -517,94 +621,63 @@ async def get_social_analytics(
     """
     require_super_admin(current_user)
     
-    # Build base query
-    social_base_query = select(SocialClick)
-    
-    # Hierarchical filtering
-    if branch_id:
-        social_base_query = social_base_query.where(SocialClick.branch_id == branch_id)
-    elif cluster_id:
-        # Get all branches in cluster
-        branch_ids_query = select(Branch.id).where(Branch.cluster_id == cluster_id)
-        branch_ids_result = await db.execute(branch_ids_query)
-        branch_ids = [row[0] for row in branch_ids_result.all()]
-        social_base_query = social_base_query.where(SocialClick.branch_id.in_(branch_ids))
-    elif region_id:
-        # Get all branches in region
-        branch_ids_query = select(Branch.id).join(Cluster).where(Cluster.region_id == region_id)
-        branch_ids_result = await db.execute(branch_ids_query)
-        branch_ids = [row[0] for row in branch_ids_result.all()]
-        social_base_query = social_base_query.where(SocialClick.branch_id.in_(branch_ids))
-    
-    # Date filters
-    if start_date:
-        try:
-            social_base_query = social_base_query.where(SocialClick.clicked_at >= datetime.fromisoformat(start_date))
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            social_base_query = social_base_query.where(SocialClick.clicked_at <= end_dt)
-        except ValueError:
-            pass
-    
-    # Total clicks - use the same base query
-    total_query = select(func.count()).select_from(social_base_query.subquery())
-    total_clicks = (await db.execute(total_query)).scalar() or 0
-    
-    # Platform breakdown
-    platform_query = select(
-        SocialClick.platform,
-        func.count(SocialClick.id).label('count')
+    cache_key = analytics_cache_key(
+        "social",
+        region_id=region_id,
+        cluster_id=cluster_id,
+        branch_id=branch_id,
+        start_date=start_date,
+        end_date=end_date
     )
+    body = analytics_cache.get(cache_key)
+    if body is None:
+        analytics = await get_social_analytics_internal(
+            db, region_id, cluster_id, branch_id, *parse_date_window(start_date, end_date)
+        )
+        body = to_json(analytics)
+        analytics_cache.set(cache_key, body, ttl=analytics_cache_ttl(cache_key))
     
-    # Apply the same filters as social_base_query
+    return analytics_json_response(body, request)
+
+
+async def get_social_analytics_internal(
+    db: AsyncSession,
+    region_id: Optional[int] = None,
+    cluster_id: Optional[int] = None,
+    branch_id: Optional[int] = None,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None
+) -> SocialAnalytics:
+    """Internal function to get social media analytics"""
+    
+    # Hierarchical filtering - branches in scope inlined as a subquery, no extra round-trip
+    branch_ids_query = None
     if branch_id:
-        platform_query = platform_query.where(SocialClick.branch_id == branch_id)
+        branch_ids_query = select(Branch.id).where(Branch.id == branch_id)
     elif cluster_id:
         branch_ids_query = select(Branch.id).where(Branch.cluster_id == cluster_id)
-        branch_ids_result = await db.execute(branch_ids_query)
-        branch_ids = [row[0] for row in branch_ids_result.all()]
-        platform_query = platform_query.where(SocialClick.branch_id.in_(branch_ids))
     elif region_id:
         branch_ids_query = select(Branch.id).join(Cluster).where(Cluster.region_id == region_id)
-        branch_ids_result = await db.execute(branch_ids_query)
-        branch_ids = [row[0] for row in branch_ids_result.all()]
-        platform_query = platform_query.where(SocialClick.branch_id.in_(branch_ids))
-    
-    if start_date:
-        try:
-            platform_query = platform_query.where(SocialClick.clicked_at >= datetime.fromisoformat(start_date))
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            platform_query = platform_query.where(SocialClick.clicked_at <= end_dt)
-        except ValueError:
-            pass
-    
-    platform_query = platform_query.group_by(SocialClick.platform).order_by(func.count(SocialClick.id).desc())
     
-    platform_result = await db.execute(platform_query)
-    platform_breakdown = [
-        {"platform": row.platform, "count": row.count}
-        for row in platform_result.all()
-    ]
-    
-    # New vs Returning - pass query object, not filters list
-    new_vs_returning = await calculate_new_vs_returning(
-        db, qr_base_query=None, social_base_query=social_base_query
-    )
-    
-    return SocialAnalytics(
+    total_clicks = 0
+    new_vs_returning = _EMPTY_NVR
+    platform_breakdown = []
+    for platform, count, new, returning in await get_platform_counts(
+        db, branch_ids_query, start_dt, end_dt
+    ):
+        if platform is None:
+            total_clicks = count
+            new_vs_returning = build_new_vs_returning(new, returning)
+        else:
+            platform_breakdown.append({"platform": platform, "count": count})
+    
+    platform_breakdown.sort(key=lambda p: p["count"], reverse=True)
+    
+    return SocialAnalytics.model_construct(
         total_clicks=total_clicks,
         new_vs_returning=new_vs_returning,
         platform_breakdown=platform_breakdown,
         region_id=region_id,
         cluster_id=cluster_id,
         branch_id=branch_id
-    )
\ No newline at end of file
+    )
@@ -3,7 +3,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from schemas import UserLogin, Token, UserCreate, UserResponse
-from auth import authenticate_user, create_access_token, get_password_hash, get_current_user
+from fastapi.security import HTTPAuthorizationCredentials
+from auth import authenticate_user, create_access_token, get_password_hash, get_current_user, forget_token, security
 from models import User
 from config import settings
 
@@ -95,12 +96,16 @@ async def get_me(current_user: User = Depends(get_current_user)):
 # LOGOUT (Client-side handling)
 # ============================================
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user)
+):
     """
     Logout endpoint.
     Since JWT is stateless, logout is handled client-side by deleting the token.
-    This endpoint just validates the token is still valid.
+    This endpoint validates the token and drops its cached user.
     """
+    forget_token(credentials.credentials)
     return {
         "message": "Successfully logged out",
         "detail": "Please delete the token from client storage"
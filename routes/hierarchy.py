@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, exists, update
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 
 from database import get_db
 from schemas import (
@@ -24,19 +25,74 @@ def require_super_admin(current_user: User):
         )
 
 
+async def row_exists(db: AsyncSession, *criteria) -> bool:
+    """EXISTS check - Postgres returns one boolean instead of a full row"""
+    return await db.scalar(select(exists().where(*criteria)))
+
+
+def response_columns(model, schema) -> tuple:
+    """
+    The model columns a response schema serializes. List endpoints select
+    these as plain rows (from_attributes reads them) instead of hydrating
+    ORM instances into the identity map.
+    """
+    return tuple(getattr(model, field) for field in schema.model_fields)
+
+
+# Read-only list endpoint columns, built once at import
+REGION_COLUMNS = response_columns(Region, RegionResponse)
+CLUSTER_COLUMNS = response_columns(Cluster, ClusterResponse)
+BRANCH_COLUMNS = response_columns(Branch, BranchResponse)
+
+
+# Postgres SQLSTATE for a foreign key violation
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+async def update_returning(db: AsyncSession, model, row_id: int, values: dict, parent: str):
+    """
+    UPDATE ... RETURNING in one round-trip; None if the row doesn't exist.
+    A missing parent row is caught by the foreign key instead of a SELECT
+    beforehand, and reported as a 404 for `parent`.
+    """
+    if not values:
+        return await db.get(model, row_id)
+
+    try:
+        return await db.scalar(
+            update(model).where(model.id == row_id).values(**values).returning(model)
+        )
+    except IntegrityError as e:
+        await db.rollback()
+        if getattr(e.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION:
+            raise HTTPException(status_code=404, detail=f"{parent} not found")
+        raise
+
+
+def paginate(query, limit: Optional[int], offset: int):
+    """Apply optional LIMIT/OFFSET; without a limit the full list is returned"""
+    if limit is not None:
+        query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
+    return query
+
+
 # ============================================
 # REGION ROUTES
 # ============================================
 @router.get("/regions", response_model=List[RegionResponse])
 async def get_all_regions(
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (default: all)"),
+    offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all regions"""
     result = await db.execute(
-        select(Region).order_by(Region.name)
+        paginate(select(*REGION_COLUMNS).order_by(Region.name, Region.id), limit, offset)
     )
-    return result.scalars().all()
+    return result.all()
 
 
 @router.post("/regions", response_model=RegionResponse, status_code=status.HTTP_201_CREATED)
@@ -49,10 +105,7 @@ async def create_region(
     require_super_admin(current_user)
     
     # Check if already exists
-    result = await db.execute(
-        select(Region).where(Region.name == region.name)
-    )
-    if result.scalar_one_or_none():
+    if await row_exists(db, Region.name == region.name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Region name already exists"
@@ -96,18 +149,20 @@ async def update_region(
 @router.get("/clusters", response_model=List[ClusterResponse])
 async def get_all_clusters(
     region_id: int = None,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (default: all)"),
+    offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all clusters, optionally filtered by region"""
-    query = select(Cluster)
+    query = select(*CLUSTER_COLUMNS)
     
     if region_id:
         query = query.where(Cluster.region_id == region_id)
     
-    query = query.order_by(Cluster.name)
-    result = await db.execute(query)
-    return result.scalars().all()
+    query = query.order_by(Cluster.name, Cluster.id)
+    result = await db.execute(paginate(query, limit, offset))
+    return result.all()
 
 
 @router.post("/clusters", response_model=ClusterResponse, status_code=status.HTTP_201_CREATED)
@@ -120,10 +175,7 @@ async def create_cluster(
     require_super_admin(current_user)
     
     # Verify region exists
-    result = await db.execute(
-        select(Region).where(Region.id == cluster.region_id)
-    )
-    if not result.scalar_one_or_none():
+    if not await row_exists(db, Region.id == cluster.region_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Region not found"
@@ -148,25 +200,13 @@ async def update_cluster(
 ):
     require_super_admin(current_user)
 
-    result = await db.execute(select(Cluster).where(Cluster.id == cluster_id))
-    cluster = result.scalar_one_or_none()
+    update_data = cluster_update.model_dump(exclude_unset=True)
+    cluster = await update_returning(db, Cluster, cluster_id, update_data, parent="Region")
 
     if not cluster:
         raise HTTPException(status_code=404, detail="Cluster not found")
 
-    update_data = cluster_update.model_dump(exclude_unset=True)
-
-    # Optional safety: validate region exists if region_id is being changed
-    if "region_id" in update_data:
-        region_check = await db.execute(select(Region).where(Region.id == update_data["region_id"]))
-        if not region_check.scalar_one_or_none():
-            raise HTTPException(status_code=404, detail="Region not found")
-
-    for key, value in update_data.items():
-        setattr(cluster, key, value)
-
     await db.commit()
-    await db.refresh(cluster)
     return cluster
 
 
@@ -177,11 +217,13 @@ async def update_cluster(
 async def get_all_branches(
     region_id: int = None,
     cluster_id: int = None,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (default: all)"),
+    offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all branches, optionally filtered by region or cluster"""
-    query = select(Branch)
+    query = select(*BRANCH_COLUMNS)
     
     if cluster_id:
         query = query.where(Branch.cluster_id == cluster_id)
@@ -189,9 +231,9 @@ async def get_all_branches(
         # Get branches through cluster
         query = query.join(Cluster).where(Cluster.region_id == region_id)
     
-    query = query.order_by(Branch.name)
-    result = await db.execute(query)
-    return result.scalars().all()
+    query = query.order_by(Branch.name, Branch.id)
+    result = await db.execute(paginate(query, limit, offset))
+    return result.all()
 
 
 @router.post("/branches", response_model=BranchResponse, status_code=status.HTTP_201_CREATED)
@@ -204,10 +246,7 @@ async def create_branch(
     require_super_admin(current_user)
     
     # Verify cluster exists
-    result = await db.execute(
-        select(Cluster).where(Cluster.id == branch.cluster_id)
-    )
-    if not result.scalar_one_or_none():
+    if not await row_exists(db, Cluster.id == branch.cluster_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cluster not found"
@@ -233,25 +272,13 @@ async def update_branch(
 ):
     require_super_admin(current_user)
 
-    result = await db.execute(select(Branch).where(Branch.id == branch_id))
-    branch = result.scalar_one_or_none()
+    update_data = branch_update.model_dump(exclude_unset=True)
+    branch = await update_returning(db, Branch, branch_id, update_data, parent="Cluster")
 
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
 
-    update_data = branch_update.model_dump(exclude_unset=True)
-
-    # Optional safety: validate cluster exists if cluster_id is added later
-    if "cluster_id" in update_data:
-        cluster_check = await db.execute(select(Cluster).where(Cluster.id == update_data["cluster_id"]))
-        if not cluster_check.scalar_one_or_none():
-            raise HTTPException(status_code=404, detail="Cluster not found")
-
-    for key, value in update_data.items():
-        setattr(branch, key, value)
-
     await db.commit()
-    await db.refresh(branch)
     return branch
 
 
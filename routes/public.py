@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from string import Template
+from datetime import datetime, timezone
+from typing import Optional
 import logging
 import uuid
 
-from database import get_db
+from database import get_db, async_session_maker
 from models import QRCode, QRScan, SocialClick
 from utils import parse_device_info, get_location_from_ip, get_location_from_gps
+from utils_cache import bump_data_version, qr_code_cache
+from scan_writer import enqueue_scan
 from utils_session import is_new_user_atomic  # ✅ NEW: Atomic session deduplication
 from config import settings
 
@@ -26,35 +31,12 @@ logger = logging.getLogger(__name__)
 
 
 
-@router.get("/r/{code}")
-async def redirect_qr(code: str, request: Request, db: AsyncSession = Depends(get_db)):
-    """
-    QR code redirect endpoint.
-    Session is generated server-side and injected to prevent phantom users.
-    """
-    try:
-        result = await db.execute(
-            select(QRCode.id, QRCode.target_url, QRCode.is_active, QRCode.code)
-            .where(QRCode.code == code)
-        )
-        qr_data = result.one_or_none()
-
-        if not qr_data:
-            raise HTTPException(status_code=404, detail="QR code not found")
-
-        qr_id, target_url, is_active, qr_code = qr_data
-
-        if not is_active:
-            raise HTTPException(status_code=410, detail="QR code deactivated")
-
-        separator = "&" if "?" in target_url else "?"
-        redirect_url = f"{target_url}{separator}branch={qr_code}"
-
-        # ✅ Generate session BEFORE HTML (fixes phantom users)
-        session_id = request.cookies.get("qr_session") or str(uuid.uuid4())
-
-        # ✅ HTML with guaranteed scan logging
-        html_content = f"""<!DOCTYPE html>
+# ============================================
+# REDIRECT PAGE
+# ============================================
+# Parsed once at import; each scan only substitutes its values.
+# JS template literals are escaped as $${...}.
+REDIRECT_HTML = Template(r"""<!DOCTYPE html>
 <html>
 <head>
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
@@ -62,68 +44,111 @@ async def redirect_qr(code: str, request: Request, db: AsyncSession = Depends(ge
 </head>
 <body>
 <script>
-const QR_ID = {qr_id};
-const TARGET_URL = "{redirect_url}";
-const API = "{settings.BASE_URL}";
-const SESSION_ID = "{session_id}";
+const QR_ID = $qr_id;
+const TARGET_URL = "$redirect_url";
+const API = "$api";
+const SESSION_ID = "$session_id";
+
+const GPS_WAIT_MS = $gps_wait_ms;
 
 let scanLogged = false;
 
-function sendLog(lat, lon, accuracy, isUpdate) {{
-    // Prevent duplicate logs (only allow one initial + optional GPS update)
-    if (!isUpdate && scanLogged) return;
+function sendLog(lat, lon, accuracy) {
+    // Exactly one log per page load
+    if (scanLogged) return;
+    scanLogged = true;
     
-    const payload = {{
+    const payload = {
         qr_code_id: QR_ID,
         latitude: lat,
         longitude: lon,
         accuracy: accuracy,
         user_agent: navigator.userAgent,
-        session_id: SESSION_ID,
-        is_gps_update: isUpdate || false
-    }};
+        session_id: SESSION_ID
+    };
 
     // Use sendBeacon for guaranteed delivery
     const sent = navigator.sendBeacon(
-        `${{API}}/api/scan-log`,
-        new Blob([JSON.stringify(payload)], {{ type: 'application/json' }})
+        `$${API}/api/scan-log`,
+        new Blob([JSON.stringify(payload)], { type: 'application/json' })
     );
     
-    if (!sent) {{
+    if (!sent) {
         // Fallback to fetch with keepalive
-        fetch(`${{API}}/api/scan-log`, {{
+        fetch(`$${API}/api/scan-log`, {
             method: "POST",
-            headers: {{ "Content-Type": "application/json" }},
+            headers: { "Content-Type": "application/json" },
             body: JSON.stringify(payload),
             keepalive: true
-        }}).catch(() => {{}});
-    }}
-    
-    if (!isUpdate) scanLogged = true;
-}}
-
-// ✅ ALWAYS log immediately (guarantees scan is recorded)
-sendLog(null, null, null, false);
-
-// ✅ Try to get GPS and update (optional, non-blocking)
-if (navigator.geolocation) {{
+        }).catch(() => {});
+    }
+}
+
+function logAndRedirect(lat, lon, accuracy) {
+    if (scanLogged) return;
+    sendLog(lat, lon, accuracy);
+
+    // ✅ Small delay to ensure sendBeacon fires (Safari/iOS fix)
+    setTimeout(() => {
+        window.location.replace(TARGET_URL);
+    }, 100);
+}
+
+// ✅ One log per scan: with GPS if a position arrives within GPS_WAIT_MS,
+// without it otherwise (no position, denied, or permission prompt pending)
+if (navigator.geolocation) {
     navigator.geolocation.getCurrentPosition(
-        pos => {{
-            // Update existing scan with GPS data
-            sendLog(pos.coords.latitude, pos.coords.longitude, pos.coords.accuracy, true);
-        }},
-        () => {{}}, // GPS failed, but initial scan already logged
-        {{ timeout: 2000, enableHighAccuracy: false }}
+        pos => logAndRedirect(pos.coords.latitude, pos.coords.longitude, pos.coords.accuracy),
+        () => logAndRedirect(null, null, null),
+        { timeout: GPS_WAIT_MS, maximumAge: 600000, enableHighAccuracy: false }
     );
-}}
-
-// ✅ Small delay to ensure sendBeacon fires (Safari/iOS fix)
-setTimeout(() => {{
-    window.location.replace(TARGET_URL);
-}}, 100);
+}
+setTimeout(() => logAndRedirect(null, null, null), navigator.geolocation ? GPS_WAIT_MS : 0);
 </script>
 </body>
-</html>"""
+</html>""")
+API_BASE = settings.BASE_URL
+GPS_WAIT_MS = settings.QR_GPS_WAIT_MS
+
+
+@router.get("/r/{code}")
+async def redirect_qr(code: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    QR code redirect endpoint.
+    Session is generated server-side and injected to prevent phantom users.
+    """
+    try:
+        # Repeat scans of the same code skip the database
+        qr_data = qr_code_cache.get(code)
+        if qr_data is None:
+            result = await db.execute(
+                select(QRCode.id, QRCode.target_url, QRCode.is_active)
+                .where(QRCode.code == code)
+            )
+            qr_data = result.one_or_none()
+
+            if not qr_data:
+                raise HTTPException(status_code=404, detail="QR code not found")
+
+            qr_data = tuple(qr_data)
+            qr_code_cache.set(code, qr_data)
+
+        qr_id, target_url, is_active = qr_data
+
+        if not is_active:
+            raise HTTPException(status_code=410, detail="QR code deactivated")
+
+        separator = "&" if "?" in target_url else "?"
+        redirect_url = f"{target_url}{separator}branch={code}"
+
+        # ✅ Generate session BEFORE HTML (fixes phantom users)
+        session_id = request.cookies.get("qr_session") or str(uuid.uuid4())
+
+        # ✅ HTML with guaranteed scan logging
+        html_content = REDIRECT_HTML.substitute(
+            qr_id=qr_id, redirect_url=redirect_url, api=API_BASE,
+            session_id=session_id, gps_wait_ms=GPS_WAIT_MS
+        )
 
         response = HTMLResponse(content=html_content)
 
@@ -145,115 +170,143 @@ setTimeout(() => {{
         raise HTTPException(status_code=500, detail="Internal error")
 
 
-@router.post("/api/scan-log")
-async def log_scan(request: Request, db: AsyncSession = Depends(get_db)):
+# sendBeacon ignores the response, so scan-log answers with an empty 204;
+# development keeps the JSON details for debugging
+SCAN_LOG_DETAILS = settings.ENVIRONMENT == "development"
+
+
+def scan_log_response(**details) -> Response:
+    """Empty 204 for the beacon, or the details as JSON in development"""
+    if SCAN_LOG_DETAILS:
+        return JSONResponse(details)
+    return Response(status_code=204)
+
+
+@router.post("/api/scan-log", status_code=204, response_class=Response)
+async def log_scan(request: Request, background_tasks: BackgroundTasks):
     """
     Log QR code scan.
-    Handles both initial scan and GPS updates.
+    One log per redirect, with GPS coordinates when the page got a fix.
+    The beacon is answered right away; the scan is resolved and stored by
+    record_scan after the response has been sent.
     """
     try:
         data = await request.json()
+    except Exception as e:
+        logger.warning(f"Unreadable scan log: {e}")
+        return scan_log_response(status="error")
+
+    if not isinstance(data, dict):
+        return scan_log_response(status="error")
+
+    # Checked here, before the scan is scheduled (bool is an int subclass)
+    qr_code_id = data.get("qr_code_id")
+    if not isinstance(qr_code_id, int) or isinstance(qr_code_id, bool):
+        logger.warning(f"Scan log with invalid QR id: {qr_code_id!r}")
+        return scan_log_response(status="error")
+
+    frontend_session = data.get("session_id", "")
+
+    # The redirect page sends one log per scan with GPS included; separate
+    # GPS updates only come from pages rendered by older versions, whose
+    # scan is already recorded
+    if data.get("is_gps_update"):
+        return scan_log_response(status="ignored")
+
+    cookie_session = request.cookies.get("qr_session")
+
+    # Session priority: frontend > cookie > new
+    if frontend_session:
+        session_id = frontend_session
+    elif cookie_session:
+        session_id = cookie_session
+    else:
+        session_id = str(uuid.uuid4())
+        logger.warning(f"No session for QR {qr_code_id}, created fallback")
+
+    background_tasks.add_task(
+        record_scan,
+        qr_code_id=qr_code_id,
+        session_id=session_id,
+        user_agent=data.get("user_agent", ""),
+        ip_address=request.client.host if request.client else None,
+        latitude=data.get("latitude"),
+        longitude=data.get("longitude"),
+        scanned_at=datetime.now(timezone.utc)
+    )
+    return scan_log_response(status="accepted", session_id=session_id)
+
+
+async def record_scan(
+    qr_code_id: int,
+    session_id: str,
+    user_agent: str,
+    ip_address: Optional[str],
+    latitude: Optional[float],
+    longitude: Optional[float],
+    scanned_at: datetime
+):
+    """
+    Resolve branch, new-vs-returning and location for a scan and store it.
+    Runs as a background task with its own session, since the request's
+    session is gone by the time it starts.
+    """
+    async with async_session_maker() as db:
+        try:
+            # Scans carry their QR code's branch_id so analytics can skip the qr_codes join
+            branch_id = await db.scalar(
+                select(QRCode.branch_id).where(QRCode.id == qr_code_id)
+            )
+            if branch_id is None:
+                logger.warning(f"Scan log for unknown QR {qr_code_id}")
+                return
 
-        qr_code_id = data.get("qr_code_id")
-        latitude = data.get("latitude")
-        longitude = data.get("longitude")
-        accuracy = data.get("accuracy")
-        user_agent = data.get("user_agent", "")
-        frontend_session = data.get("session_id", "")
-        is_gps_update = data.get("is_gps_update", False)
-
-        ip_address = request.client.host if request.client else None
-        cookie_session = request.cookies.get("qr_session")
-
-        # Session priority: frontend > cookie > new
-        if frontend_session:
-            session_id = frontend_session
-        elif cookie_session:
-            session_id = cookie_session
-        else:
-            session_id = str(uuid.uuid4())
-            logger.warning(f"No session for QR {qr_code_id}, created fallback")
-
-        # ✅ If this is a GPS update, try to update existing scan
-        if is_gps_update and latitude and longitude:
-            # Find most recent scan from this session for this QR
-            from datetime import datetime, timedelta
-            time_threshold = datetime.utcnow() - timedelta(minutes=5)
+            device_info = parse_device_info(user_agent)
             
-            result = await db.execute(
-                select(QRScan)
-                .where(
-                    QRScan.qr_code_id == qr_code_id,
-                    QRScan.session_id == session_id,
-                    QRScan.scanned_at >= time_threshold,
-                    QRScan.latitude.is_(None)  # Only update if no GPS data yet
-                )
-                .order_by(QRScan.scanned_at.desc())
-                .limit(1)
+            # ✅ ATOMIC check: Use database constraint to prevent phantom users
+            # This call will ALWAYS return the correct value, even with race conditions
+            is_new = await is_new_user_atomic(
+                db, 
+                session_id, 
+                action_type="qr_scan",
+                qr_code_id=qr_code_id
             )
-            existing_scan = result.scalar_one_or_none()
-            
-            if existing_scan:
-                # Update existing scan with GPS data
+
+            # Get location data
+            if latitude and longitude:
                 location_data = await get_location_from_gps(latitude, longitude)
-                
-                existing_scan.latitude = latitude
-                existing_scan.longitude = longitude
-                existing_scan.country = location_data.get("country") if location_data else existing_scan.country
-                existing_scan.city = location_data.get("city") if location_data else existing_scan.city
-                existing_scan.region = location_data.get("region") if location_data else existing_scan.region
-                
-                await db.commit()
-                
-                logger.info(f"✅ Updated scan #{existing_scan.id} with GPS data")
-                return {"status": "updated", "scan_id": existing_scan.id}
-
-        # ✅ Create new scan record
-        device_info = parse_device_info(user_agent)
-        
-        # ✅ ATOMIC check: Use database constraint to prevent phantom users
-        # This call will ALWAYS return the correct value, even with race conditions
-        is_new = await is_new_user_atomic(
-            db, 
-            session_id, 
-            action_type="qr_scan",
-            qr_code_id=qr_code_id
-        )
+            else:
+                location_data = await get_location_from_ip(ip_address)
+
+            scan_values = dict(
+                qr_code_id=qr_code_id,
+                branch_id=branch_id,
+                scanned_at=scanned_at,
+                device_type=device_info["device_type"],
+                device_name=device_info["device_name"],
+                browser=device_info["browser"],
+                os=device_info["os"],
+                ip_address=ip_address,
+                country=location_data.get("country") if location_data else None,
+                city=location_data.get("city") if location_data else None,
+                region=location_data.get("region") if location_data else None,
+                session_id=session_id,
+                is_new_user=is_new,
+                user_agent=user_agent
+            )
 
-        # Get location data
-        if latitude and longitude:
-            location_data = await get_location_from_gps(latitude, longitude)
-        else:
-            location_data = await get_location_from_ip(ip_address)
-
-        scan = QRScan(
-            qr_code_id=qr_code_id,
-            device_type=device_info["device_type"],
-            device_name=device_info["device_name"],
-            browser=device_info["browser"],
-            os=device_info["os"],
-            ip_address=ip_address,
-            country=location_data.get("country") if location_data else None,
-            city=location_data.get("city") if location_data else None,
-            region=location_data.get("region") if location_data else None,
-            session_id=session_id,
-            is_new_user=is_new,
-            user_agent=user_agent
-        )
+            # Buffered for the next batch insert
+            if enqueue_scan(**scan_values):
+                logger.debug("✅ Scan queued for QR %s (Session: %.8s...)", qr_code_id, session_id)
+                return
 
-        db.add(scan)
-        await db.commit()
-        await db.refresh(scan)
+            scan = QRScan(**scan_values)
+            db.add(scan)
+            await db.commit()
+            bump_data_version()
 
-        logger.info(f"✅ Scan #{scan.id} recorded for QR {qr_code_id} (Session: {session_id[:8]}...)")
-        
-        return {
-            "status": "success",
-            "scan_id": scan.id,
-            "is_new_user": is_new
-        }
+            logger.debug("✅ Scan #%s recorded for QR %s (Session: %.8s...)", scan.id, qr_code_id, session_id)
 
-    except Exception as e:
-        logger.error(f"❌ Scan log error: {e}", exc_info=True)
-        await db.rollback()
-        return {"status": "error"}
\ No newline at end of file
+        except Exception as e:
+            logger.error(f"❌ Scan log error: {e}", exc_info=True)
+            await db.rollback()
\ No newline at end of file
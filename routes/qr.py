@@ -3,7 +3,6 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, case, extract
 from typing import List, Optional
 from datetime import datetime, timedelta
-import qrcode
 import io
 import logging
 
@@ -12,6 +11,7 @@ from auth import get_current_user
 from models import User, QRCode, QRScan, Branch
 from schemas import QRCodeCreate, QRCodeUpdate, QRCodeResponse, QRAnalytics, QRScanResponse
 from config import settings
+from utils_cache import qr_code_cache
 from datetime import datetime, timedelta, date, time
 from typing import Optional
 from zoneinfo import ZoneInfo
@@ -81,7 +81,7 @@ async def list_qr_codes(
             }
             response_list.append(qr_dict)
 
-        logger.info(f"Listed {len(response_list)} QR codes for user {current_user.id}")
+        logger.debug("Listed %d QR codes for user %s", len(response_list), current_user.id)
         return response_list
 
     except Exception as e:
@@ -246,12 +246,12 @@ async def update_qr_code(
         
         await db.commit()
         await db.refresh(qr_code)
+        qr_code_cache.pop(qr_code.code)
         
         # Get scan count
-        scan_count_result = await db.execute(
-            select(func.count(QRScan.id)).where(QRScan.qr_code_id == qr_code.id)
+        scan_count = await db.scalar(
+            select(func.count()).where(QRScan.qr_code_id == qr_code.id)
         )
-        scan_count = scan_count_result.scalar()
         
         # Set scan_count as attribute for response model
         qr_code.scan_count = scan_count
@@ -301,6 +301,7 @@ async def delete_qr_code(
         
         await db.delete(qr_code)
         await db.commit()
+        qr_code_cache.pop(qr_code.code)
         
         logger.info(f"Deleted QR code {qr_id} by user {current_user.id}")
         return None
@@ -355,7 +356,10 @@ async def get_qr_image(
         # Build redirect URL
         redirect_url = f"{settings.BASE_URL}/r/{qr_code.code}"
 
-        # Generate QR image
+        # Generate QR image - qrcode (and PIL behind it) is imported on first
+        # use so worker boot and non-image routes don't pay for it
+        import qrcode
+
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -484,7 +488,7 @@ async def get_qr_analytics(
 
         counts_result = await db.execute(
             select(
-                func.count(QRScan.id).label("total_scans"),
+                func.count().label("total_scans"),
                 func.sum(case((QRScan.scanned_at >= utc_today_start, 1), else_=0)).label("scans_today"),
                 func.sum(case((QRScan.scanned_at >= utc_now - timedelta(days=7), 1), else_=0)).label("scans_week"),
                 func.sum(case((QRScan.scanned_at >= utc_now - timedelta(days=30), 1), else_=0)).label("scans_month"),
@@ -501,7 +505,7 @@ async def get_qr_analytics(
         device_result = await db.execute(
             select(
                 QRScan.device_type,
-                func.count(QRScan.id).label("count")
+                func.count().label("count")
             )
             .where(and_(*filters))
             .group_by(QRScan.device_type)
@@ -526,11 +530,11 @@ async def get_qr_analytics(
             select(
                 QRScan.city,
                 QRScan.country,
-                func.count(QRScan.id).label("count")
+                func.count().label("count")
             )
             .where(and_(*filters, QRScan.city.isnot(None)))
             .group_by(QRScan.city, QRScan.country)
-            .order_by(func.count(QRScan.id).desc())
+            .order_by(func.count().desc())
             .limit(5)
         )
 
@@ -542,11 +546,11 @@ async def get_qr_analytics(
         country_result = await db.execute(
             select(
                 QRScan.country,
-                func.count(QRScan.id).label("count")
+                func.count().label("count")
             )
             .where(and_(*filters, QRScan.country.isnot(None)))
             .group_by(QRScan.country)
-            .order_by(func.count(QRScan.id).desc())
+            .order_by(func.count().desc())
             .limit(5)
         )
 
@@ -578,10 +582,9 @@ async def get_qr_analytics(
 
         # PAGINATED SCANS - OPTIMIZED
         # Count total filtered scans
-        filtered_count_result = await db.execute(
-            select(func.count(QRScan.id)).where(and_(*filters))
-        )
-        filtered_total = filtered_count_result.scalar() or 0
+        filtered_total = await db.scalar(
+            select(func.count()).where(and_(*filters))
+        ) or 0
         
         # Calculate pagination
         offset = (page - 1) * page_size
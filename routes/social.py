@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Request, Depends, Query
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select
 from pathlib import Path
+from datetime import date
 from typing import Optional
 import logging
 import uuid
 
 from database import get_db
-from models import SocialClick, QRCode, QRScan
-from utils import parse_device_info, get_location_from_ip
+from models import Branch, SocialClick, QRCode, QRScan
+from rollups import get_platform_counts
+from utils import parse_device_info, get_location_from_ip, parse_date_window
+from utils_cache import analytics_cache, analytics_cache_key, analytics_cache_ttl, bump_data_version
 from utils_session import is_new_user_atomic  # ✅ NEW: Atomic session deduplication
 
 router = APIRouter(tags=["Social Links"])
@@ -118,8 +121,9 @@ async def log_social_click(request: Request, db: AsyncSession = Depends(get_db))
 
         db.add(click)
         await db.commit()
+        bump_data_version()
 
-        logger.info(f"✅ Social click recorded: {platform} (Session: {session_id[:8]}...)")
+        logger.debug("✅ Social click recorded: %s (Session: %.8s...)", platform, session_id)
         return {"status": "success", "is_new_user": is_new}
 
     except Exception as e:
@@ -129,45 +133,44 @@ async def log_social_click(request: Request, db: AsyncSession = Depends(get_db))
 
 @router.get("/api/social-analytics")
 async def get_social_analytics(
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
     branch_id: Optional[int] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """Get social media analytics"""
-    try:
-        from datetime import datetime, timedelta
-
-        filters = []
-
-        if branch_id:
-            filters.append(SocialClick.branch_id == branch_id)
-
-        if start_date:
-            filters.append(SocialClick.clicked_at >= datetime.fromisoformat(start_date))
-
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date) + timedelta(days=1) - timedelta(seconds=1)
-            filters.append(SocialClick.clicked_at <= end_dt)
-
-        query = select(
-            SocialClick.platform,
-            func.count(SocialClick.id).label('count')
-        ).group_by(SocialClick.platform).order_by(func.count(SocialClick.id).desc())
+    # Same in-process cache as /analytics - invalidated by every recorded click
+    cache_key = analytics_cache_key(
+        "social_links",
+        start_date=start_date,
+        end_date=end_date,
+        branch_id=branch_id
+    )
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-        if filters:
-            query = query.where(and_(*filters))
-
-        result = await db.execute(query)
-        platform_stats = [{"platform": row.platform, "count": row.count} for row in result]
-
-        total_query = select(func.count(SocialClick.id))
-        if filters:
-            total_query = total_query.where(and_(*filters))
-
-        total_clicks = (await db.execute(total_query)).scalar() or 0
-
-        return {"total_clicks": total_clicks, "platforms": platform_stats, "branch_id": branch_id}
+    try:
+        # Dates are validated by FastAPI (422 on bad input) and parsed once
+        start_dt, end_dt = parse_date_window(start_date, end_date)
+
+        branch_ids = select(Branch.id).where(Branch.id == branch_id) if branch_id else None
+
+        # Total + per-platform counts in one query (completed days from the
+        # daily rollup): the ROLLUP grand-total row has platform None
+        total_clicks = 0
+        platform_stats = []
+        for platform, count, _, _ in await get_platform_counts(db, branch_ids, start_dt, end_dt):
+            if platform is None:
+                total_clicks = count
+            else:
+                platform_stats.append({"platform": platform, "count": count})
+
+        platform_stats.sort(key=lambda p: p["count"], reverse=True)
+
+        analytics = {"total_clicks": total_clicks, "platforms": platform_stats, "branch_id": branch_id}
+        analytics_cache.set(cache_key, analytics, ttl=analytics_cache_ttl(cache_key))
+        return analytics
 
     except Exception as e:
         logger.error(f"Analytics error: {e}", exc_info=True)
@@ -0,0 +1,107 @@
+"""
+Batched QR scan inserts.
+
+/api/scan-log used to commit one transaction per scan. Scans are now buffered
+in memory and written by a background task as one multi-row INSERT every
+SCAN_FLUSH_INTERVAL seconds (or as soon as SCAN_BATCH_SIZE rows are waiting),
+so the commit cost is shared by the whole batch.
+
+Rows carry their own scanned_at, taken when the scan was logged, so batching
+doesn't shift scan times.
+"""
+
+from datetime import datetime, timezone
+from typing import List
+import asyncio
+import logging
+
+from sqlalchemy import insert
+
+from config import settings
+from database import engine
+from models import QRScan
+from utils_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Scans waiting for the next flush, oldest first
+_pending: List[dict] = []
+
+# Set when a full batch is waiting, to flush before the interval is up
+_flush_now = asyncio.Event()
+
+# One batch insert at a time (the loop, or the final flush on shutdown)
+_flush_lock = asyncio.Lock()
+
+# False until scan_flush_loop runs - log_scan then inserts scans itself
+_running = False
+
+
+def enqueue_scan(**values) -> bool:
+    """
+    Buffer a scan for the next batch insert. Returns False if the writer isn't
+    running or the buffer is full, in which case the caller inserts it itself.
+    """
+    if not _running or len(_pending) >= settings.SCAN_QUEUE_MAXSIZE:
+        return False
+
+    values.setdefault("scanned_at", datetime.now(timezone.utc))
+    _pending.append(values)
+    if len(_pending) >= settings.SCAN_BATCH_SIZE:
+        _flush_now.set()
+    return True
+
+
+async def flush_scans() -> int:
+    """Insert every buffered scan in one transaction. Returns the row count."""
+    async with _flush_lock:
+        if not _pending:
+            return 0
+
+        batch = _pending[:]
+        _pending.clear()
+
+        # executemany needs the same keys in every row
+        columns = set().union(*batch)
+        rows = [{column: row.get(column) for column in columns} for row in batch]
+
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(insert(QRScan), rows)
+            inserted = len(rows)
+        except Exception as e:
+            # One bad row (e.g. its QR code was deleted meanwhile) fails the
+            # whole batch - retry row by row so only that scan is lost
+            logger.warning(f"Batch insert of {len(rows)} scans failed, retrying one by one: {e}")
+            inserted = 0
+            for row in rows:
+                try:
+                    async with engine.begin() as conn:
+                        await conn.execute(insert(QRScan), row)
+                    inserted += 1
+                except Exception as row_error:
+                    logger.error(f"❌ Dropped scan for QR {row.get('qr_code_id')}: {row_error}")
+
+    if inserted:
+        bump_data_version()
+    logger.debug("Flushed %d scans", inserted)
+    return inserted
+
+
+async def scan_flush_loop():
+    """Background task: flush buffered scans every SCAN_FLUSH_INTERVAL seconds"""
+    global _running
+    _running = True
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(_flush_now.wait(), timeout=settings.SCAN_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _flush_now.clear()
+
+            await flush_scans()
+    finally:
+        # Cancelled on shutdown: stop buffering and write what's left
+        _running = False
+        await flush_scans()
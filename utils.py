@@ -1,14 +1,47 @@
 import httpx
-from typing import Dict, Optional
+import logging
+from functools import lru_cache
+from datetime import datetime, timedelta, date, time, timezone
+from typing import Dict, Optional, Tuple
+
+from config import settings
+from utils_cache import TTLCache
+
+try:
+    import maxminddb  # Optional: only needed when GEOIP_DB_PATH is set
+except ImportError:
+    maxminddb = None
+
+logger = logging.getLogger(__name__)
 
 # ============================================
 # DEVICE INFO PARSER
 # ============================================
+# The same few user agents account for most scans, so results are memoized -
+# but only for user agents of a sane length, since the client picks the key
+MAX_CACHED_USER_AGENT_LENGTH = 512
+
+
 def parse_device_info(user_agent: str) -> Dict[str, str]:
     """
     Parse user agent into user-friendly device information.
     Returns: device_type, device_name, browser, os
     """
+    if len(user_agent) <= MAX_CACHED_USER_AGENT_LENGTH:
+        device_type, device_name, browser, os = _parse_user_agent_cached(user_agent)
+    else:
+        device_type, device_name, browser, os = _parse_user_agent(user_agent)
+
+    return {
+        "device_type": device_type,
+        "device_name": device_name,
+        "browser": browser,
+        "os": os
+    }
+
+
+def _parse_user_agent(user_agent: str) -> Tuple[str, str, str, str]:
+    """(device_type, device_name, browser, os) for a user agent"""
     ua = user_agent.lower()
     
     # Determine device type
@@ -97,22 +130,61 @@ def parse_device_info(user_agent: str) -> Dict[str, str]:
     # elif 'linux' in ua:
     #     os = "Linux"
     
-    return {
-        "device_type": device_type,
-        "device_name": device_name,
-        "browser": browser,
-        "os": os
-    }
+    return device_type, device_name, browser, os
+
+
+# Cached results are immutable tuples, so no caller can alter a shared entry
+_parse_user_agent_cached = lru_cache(maxsize=20_000)(_parse_user_agent)
+
+
+# ============================================
+# DATE RANGE FILTERS
+# ============================================
+def parse_date_window(
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Turn start/end date query params into a half-open UTC window [start, end).
+    end is midnight after end_date so the whole day is included.
+    Missing bounds come back as None (no filter).
+    """
+    start_dt = None
+    end_dt = None
+    
+    if start_date is not None:
+        start_dt = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+    
+    if end_date is not None:
+        end_dt = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    
+    return start_dt, end_dt
 
 
 # ============================================
 # GPS TO LOCATION (REVERSE GEOCODING)
 # ============================================
+# Reverse geocoding by coordinates rounded to 3 decimals (~100 m): scans at
+# the same venue resolve to the same place, and places don't move in a day
+_gps_location_cache = TTLCache(ttl=24 * 60 * 60, maxsize=50_000)
+
+
 async def get_location_from_gps(latitude: float, longitude: float) -> Dict[str, Optional[str]]:
     """
     Convert GPS coordinates to city/country using reverse geocoding.
     Uses BigDataCloud API - free, no API key needed, better accuracy.
     """
+    # Coordinates come straight from the beacon's JSON and may be strings
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return {"country": "Unknown", "city": "Unknown", "region": "Unknown"}
+
+    cache_key = (round(latitude, 3), round(longitude, 3))
+    location = _gps_location_cache.get(cache_key)
+    if location is not None:
+        return location
+    
     try:
         async with httpx.AsyncClient(timeout=5.0) as client:
             response = await client.get(
@@ -127,11 +199,14 @@ async def get_location_from_gps(latitude: float, longitude: float) -> Dict[str,
             if response.status_code == 200:
                 data = response.json()
                 
-                return {
+                location = {
                     "country": data.get("countryName"),
                     "city": data.get("city") or data.get("locality") or data.get("principalSubdivision"),
                     "region": data.get("principalSubdivision")
                 }
+                # Only successful lookups are cached; failures retry next scan
+                _gps_location_cache.set(cache_key, location)
+                return location
     except Exception as e:
         print(f"GPS location error: {e}")
     
@@ -141,9 +216,49 @@ async def get_location_from_gps(latitude: float, longitude: float) -> Dict[str,
 # ============================================
 # IP TO LOCATION (FALLBACK)
 # ============================================
+def _open_geoip_reader():
+    """Memory-map the GeoLite2-City database, or None to use ip-api.com"""
+    if not settings.GEOIP_DB_PATH:
+        return None
+    if maxminddb is None:
+        logger.warning("GEOIP_DB_PATH is set but maxminddb isn't installed, using ip-api.com")
+        return None
+    try:
+        return maxminddb.open_database(settings.GEOIP_DB_PATH, maxminddb.MODE_MMAP)
+    except Exception as e:
+        logger.warning(f"Could not open GeoIP database {settings.GEOIP_DB_PATH}, using ip-api.com: {e}")
+        return None
+
+
+_geoip_reader = _open_geoip_reader()
+
+
+def _english_name(record: Optional[dict]) -> Optional[str]:
+    return (record or {}).get("names", {}).get("en")
+
+
+def lookup_geoip(ip_address: str) -> Dict[str, Optional[str]]:
+    """Local GeoLite2-City lookup - no network round-trip"""
+    try:
+        record = _geoip_reader.get(ip_address)
+    except ValueError:  # Not a valid IP address
+        record = None
+
+    if not record:
+        return {"country": "Unknown", "city": "Unknown", "region": "Unknown"}
+
+    subdivisions = record.get("subdivisions") or [None]
+    return {
+        "country": _english_name(record.get("country")),
+        "city": _english_name(record.get("city")),
+        "region": _english_name(subdivisions[0])
+    }
+
+
 async def get_location_from_ip(ip_address: str) -> Dict[str, Optional[str]]:
     """
-    Get location data from IP address using ip-api.com (free, no key needed).
+    Get location data from IP address: the local GeoLite2 database when
+    GEOIP_DB_PATH is configured, otherwise ip-api.com (free, no key needed).
     Returns: country, city, region
     """
     if not ip_address or ip_address == "127.0.0.1" or ip_address.startswith("192.168"):
@@ -153,6 +268,9 @@ async def get_location_from_ip(ip_address: str) -> Dict[str, Optional[str]]:
             "region": "Local Network"
         }
     
+    if _geoip_reader is not None:
+        return lookup_geoip(ip_address)
+    
     try:
         async with httpx.AsyncClient(timeout=3.0) as client:
             response = await client.get(f"http://ip-api.com/json/{ip_address}")
@@ -0,0 +1,111 @@
+"""
+In-process TTL cache for read-heavy analytics responses.
+
+Analytics results don't change second-to-second, so identical dashboard
+requests within the TTL are served from memory instead of re-running the
+aggregation queries. Every cache key embeds a data version that is bumped
+whenever this worker records a QR scan or social click, so a worker never
+serves results older than its own latest write - except for date ranges that
+ended before today, which new scans/clicks can't change: those skip the data
+version and are kept for the longer ANALYTICS_CLOSED_RANGE_CACHE_TTL.
+"""
+
+from datetime import date, datetime, timezone
+from time import monotonic
+from typing import Any, Dict, Hashable, Optional, Tuple
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Minimal dict-backed cache with per-entry expiry.
+
+    Not shared between worker processes - each uvicorn worker keeps its own.
+    When full, the oldest inserted entry is evicted.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < monotonic():
+            self._data.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for `ttl` seconds (defaults to the cache TTL)"""
+        if key not in self._data and len(self._data) >= self.maxsize:
+            # Dicts keep insertion order - drop the oldest entry
+            self._data.pop(next(iter(self._data)))
+
+        self._data[key] = (monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def pop(self, key: Hashable) -> None:
+        """Remove an entry if present"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size, for /metrics"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+# Shared cache for /analytics responses
+analytics_cache = TTLCache(ttl=settings.ANALYTICS_CACHE_TTL)
+
+# /r/{code} lookups: code -> (qr_id, target_url, is_active). Dropped by the QR
+# admin routes on change; other workers pick changes up within the TTL.
+qr_code_cache = TTLCache(ttl=settings.QR_CODE_CACHE_TTL, maxsize=10_000)
+
+# Bumped on every scan/click write so cached analytics are never older
+# than this worker's latest write
+_data_version = 0
+
+
+def bump_data_version() -> None:
+    """Invalidate cached analytics after recording a scan or click"""
+    global _data_version
+    _data_version += 1
+
+
+# Stands in for the data version in keys of ranges that ended before today
+_CLOSED_RANGE = "closed"
+
+
+def _is_closed_range(end_date: Optional[date]) -> bool:
+    """True if the window ends before today (UTC), so no new event can land in it"""
+    return isinstance(end_date, date) and end_date < datetime.now(timezone.utc).date()
+
+
+def analytics_cache_key(endpoint: str, **params) -> tuple:
+    """Build a hashable cache key from the endpoint name and its filters"""
+    version = _CLOSED_RANGE if _is_closed_range(params.get("end_date")) else _data_version
+    return (endpoint, version, tuple(sorted(params.items())))
+
+
+def analytics_cache_ttl(cache_key: tuple) -> Optional[float]:
+    """TTL for an analytics_cache_key entry (None = the cache default)"""
+    if cache_key[1] == _CLOSED_RANGE:
+        return settings.ANALYTICS_CLOSED_RANGE_CACHE_TTL
+    return None
@@ -12,8 +12,16 @@ from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 import logging
 
+from utils_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+# Sessions this worker already saw in session_first_seen. Once a session is
+# there it stays (until cleanup_old_sessions, after 90 days), so a hit answers
+# "returning user" without the INSERT round-trip. Misses still go to the
+# database, which decides atomically across workers.
+_known_sessions = TTLCache(ttl=24 * 60 * 60, maxsize=100_000)
+
 
 async def is_new_user_atomic(
     db: AsyncSession, 
@@ -56,6 +64,10 @@ async def is_new_user_atomic(
         >>> # Even if 100 requests come simultaneously with same session_id
         >>> # Database guarantees ONLY ONE will return True, rest return False
     """
+    if _known_sessions.get(session_id):
+        logger.debug("🔄 RETURNING user detected: session=%.8s..., action=%s", session_id, action_type)
+        return False
+    
     try:
         # Build INSERT query with ON CONFLICT to handle race conditions gracefully
         query = text("""
@@ -82,12 +94,13 @@ async def is_new_user_atomic(
         
         # If RETURNING gave us back a session_id, the INSERT succeeded
         inserted = result.scalar_one_or_none()
+        _known_sessions.set(session_id, True)
         
         if inserted:
-            logger.info(f"✅ NEW user detected: session={session_id[:8]}..., action={action_type}")
+            logger.debug("✅ NEW user detected: session=%.8s..., action=%s", session_id, action_type)
             return True
         else:
-            logger.info(f"🔄 RETURNING user detected: session={session_id[:8]}..., action={action_type}")
+            logger.debug("🔄 RETURNING user detected: session=%.8s..., action=%s", session_id, action_type)
             return False
             
     except IntegrityError as e: